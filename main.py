@@ -2,7 +2,9 @@ import streamlit as st
 from streamlit_flow import streamlit_flow
 from streamlit_flow.layouts import TreeLayout
 
+from trees.ui.history import show_history_sidebar
 from trees.ui.node import delete_selected_node, split_selected_node
+from trees.ui.profiling import show_profiling_sidebar
 from trees.ui.session_state import SessionState
 from trees.ui.tree import initialize_tree
 
@@ -11,6 +13,8 @@ def main():
     st.set_page_config("Streamlit Flow Example", layout="wide")
     st.title("Streamlit Flow Example")
     initialize_tree()
+    show_history_sidebar()
+    show_profiling_sidebar()
 
     SessionState().curr_state = streamlit_flow(
         key="streamlit_flow_tree",
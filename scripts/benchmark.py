@@ -0,0 +1,200 @@
+"""Benchmarks of split search, row selection, node edits, tree growth and prediction.
+
+Results are saved as JSON, named after the current commit, so that runs on different commits can be
+compared with `--compare`.
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import time
+from collections.abc import Callable
+from dataclasses import asdict, dataclass, replace
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+from trees.binning import BinnedFeatures
+from trees.data import diabetes
+from trees.data.synthetic import make_dataframe
+from trees.df import DataFrame
+from trees.splitting.entropy import information_gain
+from trees.splitting.gini import gini_gain
+from trees.splitting.split import suggest_split_threshold
+from trees.splitting.xgb import XGBoostGain
+from trees.tree import Tree
+
+RESULTS_PATH = Path(__file__).parent.parent / Path("benchmarks")
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000, 10_000_000]
+CRITERIA = {"gini": gini_gain, "entropy": information_gain, "xgboost": XGBoostGain()}
+# Each benchmark is repeated until it has run for this long, within the bounds on repeats
+MIN_TOTAL_SECONDS = 0.2
+MAX_REPEATS = 20
+
+
+@dataclass
+class BenchmarkResult:
+    """Timings of one benchmark on one dataset."""
+
+    name: str
+    dataset: str
+    n_rows: int
+    n_features: int
+    repeats: int
+    min_seconds: float
+    median_seconds: float
+
+
+def time_call(run: Callable[[Any], object], setup: Callable[[], Any] = lambda: None) -> list[float]:
+    """Time `run` on fresh output of `setup` until enough time has passed."""
+    timings: list[float] = []
+    while len(timings) < MAX_REPEATS and sum(timings) < MIN_TOTAL_SECONDS:
+        arg = setup()
+        start = time.perf_counter()
+        run(arg)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def benchmark_dataframe(dataset: str, df: DataFrame, max_bins: int) -> list[BenchmarkResult]:
+    """Run every benchmark on one dataframe."""
+    feature = df.feature_names[0]
+    threshold = float(np.nanmedian(df[feature]))
+    binned_df = replace(df, bins=BinnedFeatures.from_features(df.features, max_bins))
+    ids = np.random.default_rng(0).choice(df.ids, size=len(df) // 2, replace=False)
+
+    def split_tree() -> Tree:
+        """Get a tree with its root and its root's left child split."""
+        tree = Tree.from_dataframe(df)
+        tree.split_node(tree.root.id, feature, threshold)
+        tree.split_node(tree.root.left.id, df.feature_names[-1], 0.0)
+        return tree
+
+    fitted_tree = Tree.from_dataframe(binned_df)
+    fitted_tree.fit(max_depth=6)
+
+    benchmarks: dict[str, tuple[Callable[[Any], object], Callable[[], Any]]] = {
+        **{
+            f"suggest_split_threshold[{name}]": (
+                lambda _, criterion=criterion: suggest_split_threshold(df, feature, criterion),
+                lambda: None,
+            )
+            for name, criterion in CRITERIA.items()
+        },
+        "suggest_split_threshold[gini, binned]": (
+            lambda _: suggest_split_threshold(binned_df, feature),
+            lambda: None,
+        ),
+        "get_rows_by_ids": (lambda _: df.get_rows_by_ids(ids), lambda: None),
+        "filter_to_below_threshold": (
+            lambda _: df.filter_to_below_threshold(feature, threshold),
+            lambda: None,
+        ),
+        "filter_to_above_or_at_threshold": (
+            lambda _: df.filter_to_above_or_at_threshold(feature, threshold),
+            lambda: None,
+        ),
+        "filter_to_nulls": (lambda _: df.filter_to_nulls(feature), lambda: None),
+        "binning": (lambda _: BinnedFeatures.from_features(df.features, max_bins), lambda: None),
+        "Node.split": (
+            lambda tree: tree.split_node(tree.root.id, feature, threshold),
+            lambda: Tree.from_dataframe(df),
+        ),
+        "Tree.delete_node": (
+            lambda tree: tree.delete_node(tree.root.left.id),
+            split_tree,
+        ),
+        "Tree.fit[depth=6]": (
+            lambda tree: tree.fit(max_depth=6),
+            lambda: Tree.from_dataframe(binned_df),
+        ),
+        "Tree.predict[depth=6]": (lambda tree: tree.predict(df.features), lambda: fitted_tree),
+    }
+
+    results = []
+    for name, (run, setup) in benchmarks.items():
+        timings = time_call(run, setup)
+        results.append(
+            BenchmarkResult(
+                name=name,
+                dataset=dataset,
+                n_rows=len(df),
+                n_features=len(df.feature_names),
+                repeats=len(timings),
+                min_seconds=min(timings),
+                median_seconds=statistics.median(timings),
+            )
+        )
+        print(f"{dataset:>20} {name:<40} {min(timings) * 1e3:12.3f} ms")
+    return results
+
+
+def get_commit() -> str:
+    """Get the short hash of the current commit, or "unknown" outside a git checkout."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, check=True, text=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(results: list[BenchmarkResult], baseline_path: Path) -> None:
+    """Print how much slower or faster each benchmark is than in a saved run."""
+    baseline = {
+        (result["name"], result["dataset"]): result["min_seconds"]
+        for result in json.loads(baseline_path.read_text())["results"]
+    }
+    print(f"\nCompared to {baseline_path} (ratio > 1 is slower):")
+    for result in results:
+        before = baseline.get((result.name, result.dataset))
+        if before:
+            ratio = result.min_seconds / before
+            print(f"{result.dataset:>20} {result.name:<40} {ratio:8.2f}x")
+
+
+def main() -> None:
+    """Run the benchmarks on the diabetes dataset and on synthetic datasets of several sizes."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="*", default=DEFAULT_SIZES)
+    parser.add_argument("--n-features", type=int, default=8)
+    parser.add_argument("--cardinality", type=int, default=None)
+    parser.add_argument("--nan-rate", type=float, default=0.0)
+    parser.add_argument("--max-bins", type=int, default=255)
+    parser.add_argument("--output", type=Path, default=None)
+    parser.add_argument("--compare", type=Path, default=None, help="JSON results of another run.")
+    args = parser.parse_args()
+
+    datasets = {"diabetes": diabetes.load_dataframe()}
+    for n_rows in args.sizes:
+        datasets[f"synthetic_{n_rows}"] = make_dataframe(
+            n_rows, args.n_features, args.cardinality, args.nan_rate
+        )
+    results = []
+    for dataset, df in datasets.items():
+        results.extend(benchmark_dataframe(dataset, df, args.max_bins))
+
+    commit = get_commit()
+    output = args.output or RESULTS_PATH / f"{commit}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    report = {
+        "commit": commit,
+        "timestamp": datetime.now(UTC).isoformat(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "settings": {key: str(value) for key, value in vars(args).items()},
+        "results": [asdict(result) for result in results],
+    }
+    output.write_text(json.dumps(report, indent=2))
+    print(f"Saved results to {output}")
+    if args.compare is not None:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+"""Script for serving a saved tree or ensemble over HTTP."""
+
+import argparse
+import asyncio
+from pathlib import Path
+
+from trees.serving import DEFAULT_MAX_BATCH_SIZE, DEFAULT_MAX_WAIT, ScoringServer, load_model
+
+
+def main() -> None:
+    """Load a model and score requests until interrupted."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("model_path", type=Path, help="Directory of a saved tree or ensemble.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--max-batch-size", type=int, default=DEFAULT_MAX_BATCH_SIZE)
+    parser.add_argument("--max-wait", type=float, default=DEFAULT_MAX_WAIT, help="Seconds.")
+    args = parser.parse_args()
+
+    server = ScoringServer(
+        load_model(args.model_path),
+        host=args.host,
+        port=args.port,
+        max_batch_size=args.max_batch_size,
+        max_wait=args.max_wait,
+    )
+    print(f"Serving {args.model_path} on http://{args.host}:{args.port}")
+    asyncio.run(server.serve_forever())
+
+
+if __name__ == "__main__":
+    main()
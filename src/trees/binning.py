@@ -0,0 +1,111 @@
+"""Quantile binning of feature matrices for histogram-based split finding."""
+
+from dataclasses import dataclass
+from typing import Self
+
+import numpy as np
+from numpy.typing import NDArray
+
+MAX_BINS_UINT8 = 255
+MAX_BINS_UINT16 = 65535
+
+
+@dataclass
+class BinnedFeatures:
+    """Feature matrix stored as small integer bin codes.
+
+    Row `i` of feature `j` falls into bin `b` when `bin_edges[j, b - 1] <= value < bin_edges[j, b]`,
+    so splitting at the threshold `bin_edges[j, b]` sends bins `0..b` to the left. Missing values
+    get the code `max_bins`. Unused edges are padded with NaN.
+    """
+
+    codes: NDArray[np.uint8 | np.uint16]
+    bin_edges: NDArray[np.float32]
+    max_bins: int
+
+    @classmethod
+    def from_features(cls, features: NDArray[np.float32], max_bins: int = MAX_BINS_UINT8) -> Self:
+        """Compute quantile bin edges for each feature and bin the feature matrix."""
+        bin_edges = find_bin_edges(features, max_bins)
+        return cls(
+            codes=assign_bins(features, bin_edges, max_bins), bin_edges=bin_edges, max_bins=max_bins
+        )
+
+    @property
+    def missing_code(self) -> int:
+        """Get the bin code used for missing values."""
+        return self.max_bins
+
+    def get_values_in_bins(
+        self, feature_index: int, bins: frozenset[int], n_values: int
+    ) -> frozenset[int]:
+        """Get the integers in `[0, n_values)` that fall into some bins of a feature.
+
+        For a categorical feature these are the codes of the categories in the bins.
+        """
+        edges = self.bin_edges[feature_index]
+        value_bins = _assign_bins(
+            np.arange(n_values, dtype=np.float32), edges[~np.isnan(edges)], self.max_bins
+        )
+        return frozenset(np.flatnonzero(np.isin(value_bins, list(bins))).tolist())
+
+    def take(self, rows: NDArray[np.bool_ | np.intp]) -> "BinnedFeatures":
+        """Get the binned features of a subset of rows, sharing the bin edges."""
+        return BinnedFeatures(
+            codes=self.codes[rows], bin_edges=self.bin_edges, max_bins=self.max_bins
+        )
+
+    def __add__(self, other: "BinnedFeatures") -> "BinnedFeatures":
+        """Stack the rows of two binned feature matrices that share the same bin edges."""
+        return BinnedFeatures(
+            codes=np.concatenate([self.codes, other.codes]),
+            bin_edges=self.bin_edges,
+            max_bins=self.max_bins,
+        )
+
+
+def find_bin_edges(
+    features: NDArray[np.float32], max_bins: int = MAX_BINS_UINT8
+) -> NDArray[np.float32]:
+    """Compute the quantile bin edges of each feature, padded with NaN to `max_bins - 1` edges."""
+    if not 2 <= max_bins <= MAX_BINS_UINT16:
+        msg = f"max_bins must be between 2 and {MAX_BINS_UINT16}, got {max_bins}."
+        raise ValueError(msg)
+    bin_edges = np.full((features.shape[1], max_bins - 1), np.nan, dtype=np.float32)
+    for j in range(features.shape[1]):
+        edges = _find_bin_edges(features[:, j], max_bins)
+        bin_edges[j, : len(edges)] = edges
+    return bin_edges
+
+
+def assign_bins(
+    features: NDArray[np.float32], bin_edges: NDArray[np.float32], max_bins: int
+) -> NDArray[np.uint8 | np.uint16]:
+    """Get the bin codes of a feature matrix from previously computed bin edges."""
+    dtype = np.uint8 if max_bins <= MAX_BINS_UINT8 else np.uint16
+    codes = np.empty(features.shape, dtype=dtype)
+    for j in range(features.shape[1]):
+        edges = bin_edges[j][~np.isnan(bin_edges[j])]
+        codes[:, j] = _assign_bins(features[:, j], edges, max_bins)
+    return codes
+
+
+def _find_bin_edges(feature_values: NDArray[np.float32], max_bins: int) -> NDArray[np.float32]:
+    """Get at most `max_bins - 1` edges, exact midpoints when there are few distinct values."""
+    present_values = feature_values[~np.isnan(feature_values)]
+    distinct_values = np.unique(present_values)
+    if len(distinct_values) > max_bins:
+        quantiles = np.linspace(0, 1, max_bins)
+        distinct_values = np.unique(
+            np.quantile(present_values, quantiles, method="inverted_cdf").astype(np.float32)
+        )
+    return (distinct_values[1:] + distinct_values[:-1]) / 2.0
+
+
+def _assign_bins(
+    feature_values: NDArray[np.float32], edges: NDArray[np.float32], max_bins: int
+) -> NDArray[np.intp]:
+    """Get the bin code of each value."""
+    codes = np.searchsorted(edges, feature_values, side="right")
+    codes[np.isnan(feature_values)] = max_bins
+    return codes
@@ -0,0 +1,191 @@
+"""Flat-array representation of trees for fast batch prediction."""
+
+import json
+from dataclasses import dataclass, fields
+from pathlib import Path
+from typing import Literal, Self
+
+import numpy as np
+from numpy.typing import NDArray
+
+from trees.node import Node
+
+LEAF = -1
+# Version of the on-disk layout written by `CompiledTree.save` and `Tree.save`
+FORMAT_VERSION = 4
+
+
+@dataclass
+class CompiledTree:
+    """Tree stored as struct-of-arrays, one entry per node with the root at index 0.
+
+    Leaves have a feature index and children of `LEAF`. Rows with a missing feature value go to the
+    right child where `missing_right` is set and to the left child otherwise, matching
+    `Node.split`. Splits on categorical features have a NaN threshold and a
+    lookup table `category_is_right[category_starts[i]:category_ends[i]]` of whether each category
+    code goes right; codes past the end of the table go left. Other nodes have empty tables.
+    Feature indices point into `feature_names`, which rows to predict on must have as columns.
+    """
+
+    feature_indices: NDArray[np.intp]
+    thresholds: NDArray[np.float32]
+    left_children: NDArray[np.intp]
+    right_children: NDArray[np.intp]
+    values: NDArray[np.float64]
+    missing_right: NDArray[np.bool_]
+    category_starts: NDArray[np.intp]
+    category_ends: NDArray[np.intp]
+    category_is_right: NDArray[np.bool_]
+    feature_names: list[str]
+
+    @classmethod
+    def from_root(cls, root: Node, feature_names: list[str]) -> Self:
+        """Compile the tree below the root node, numbering the nodes breadth first."""
+        feature_indices: list[int] = []
+        thresholds: list[float] = []
+        left_children: list[int] = []
+        right_children: list[int] = []
+        values: list[float] = []
+        missing_right: list[bool] = []
+        category_starts: list[int] = []
+        category_ends: list[int] = []
+        category_tables: list[NDArray[np.bool_]] = []
+        n_table_entries = 0
+
+        def add(value: float) -> int:
+            """Add a leaf to the arrays and get its index."""
+            feature_indices.append(LEAF)
+            thresholds.append(float("nan"))
+            left_children.append(LEAF)
+            right_children.append(LEAF)
+            values.append(value)
+            missing_right.append(False)
+            category_starts.append(0)
+            category_ends.append(0)
+            return len(values) - 1
+
+        # A split node missing one of its children predicts its own log odds on that side
+        queue = [(root, add(root.logodds))]
+        for node, index in queue:
+            if not node.is_split:
+                continue
+            feature_indices[index] = feature_names.index(node.feature_name)
+            thresholds[index] = node.threshold
+            missing_right[index] = node.missing_right
+            if node.categories is not None:
+                table = np.zeros(max(node.categories, default=-1) + 1, dtype=np.bool_)
+                table[list(node.categories)] = True
+                category_starts[index] = n_table_entries
+                n_table_entries += len(table)
+                category_ends[index] = n_table_entries
+                category_tables.append(table)
+            for child, children in ((node.left, left_children), (node.right, right_children)):
+                children[index] = add(node.logodds if child is None else child.logodds)
+                if child is not None:
+                    queue.append((child, children[index]))
+
+        return cls(
+            feature_indices=np.array(feature_indices, dtype=np.intp),
+            thresholds=np.array(thresholds, dtype=np.float32),
+            left_children=np.array(left_children, dtype=np.intp),
+            right_children=np.array(right_children, dtype=np.intp),
+            values=np.array(values, dtype=np.float64),
+            missing_right=np.array(missing_right, dtype=np.bool_),
+            category_starts=np.array(category_starts, dtype=np.intp),
+            category_ends=np.array(category_ends, dtype=np.intp),
+            category_is_right=np.concatenate(category_tables or [np.zeros(0, dtype=np.bool_)]),
+            feature_names=list(feature_names),
+        )
+
+    def save(self, path: Path) -> None:
+        """Save the tree as a directory of .npy files that `load` can memory-map."""
+        path.mkdir(parents=True, exist_ok=True)
+        for name in self._get_array_names():
+            np.save(path / f"{name}.npy", getattr(self, name))
+        metadata = {
+            "format_version": FORMAT_VERSION,
+            "n_nodes": self.n_nodes,
+            "n_features": self.n_features,
+            "feature_names": self.feature_names,
+        }
+        (path / "metadata.json").write_text(json.dumps(metadata))
+
+    @classmethod
+    def load(cls, path: Path, mmap: bool = True) -> Self:
+        """Load a tree saved with `save`, memory-mapping the arrays unless `mmap` is False.
+
+        Memory-mapped trees are read-only and share their pages between all the processes that
+        load the same file.
+        """
+        metadata = read_metadata(path)
+        mmap_mode: Literal["r"] | None = "r" if mmap else None
+        return cls(
+            **{
+                name: np.load(path / f"{name}.npy", mmap_mode=mmap_mode)
+                for name in cls._get_array_names()
+            },
+            feature_names=metadata["feature_names"],
+        )
+
+    @classmethod
+    def _get_array_names(cls) -> list[str]:
+        """Get the names of the fields that are saved as arrays."""
+        return [
+            array_field.name for array_field in fields(cls) if array_field.name != "feature_names"
+        ]
+
+    @property
+    def n_nodes(self) -> int:
+        """Get the number of nodes."""
+        return len(self.values)
+
+    @property
+    def n_features(self) -> int:
+        """Get the number of features that rows to predict on must have."""
+        return len(self.feature_names)
+
+    def apply(self, features: NDArray[np.float32]) -> NDArray[np.intp]:
+        """Get the index of the leaf each row ends up in.
+
+        All rows are routed together one level at a time, so the Python loop runs once per level
+        of the tree rather than once per row. Rows at categorical splits look up their category
+        code in the table of the split. Rows missing the feature of a split go the way it learned.
+        """
+        has_categories = len(self.category_is_right) > 0
+        has_missing_right = bool(self.missing_right.any())
+        positions = np.zeros(features.shape[0], dtype=np.intp)
+        rows = np.flatnonzero(self.feature_indices[positions] != LEAF)
+        while len(rows):
+            nodes = positions[rows]
+            feature_values = features[rows, self.feature_indices[nodes]]
+            is_right = feature_values >= self.thresholds[nodes]
+            if has_categories:
+                starts = self.category_starts[nodes]
+                codes = np.where(np.isnan(feature_values), -1, feature_values).astype(np.intp)
+                in_table = (codes >= 0) & (codes < self.category_ends[nodes] - starts)
+                is_right[in_table] = self.category_is_right[starts[in_table] + codes[in_table]]
+            if has_missing_right:
+                is_right |= np.isnan(feature_values) & self.missing_right[nodes]
+            positions[rows] = np.where(
+                is_right,
+                self.right_children[nodes],
+                self.left_children[nodes],
+            )
+            rows = rows[self.feature_indices[positions[rows]] != LEAF]
+        return positions
+
+    def predict(self, features: NDArray[np.float32]) -> NDArray[np.float64]:
+        """Predict the log odds for every row of the feature matrix."""
+        return self.values[self.apply(features)]
+
+
+def read_metadata(path: Path) -> dict:
+    """Read the metadata of a saved tree, checking that it was saved in a supported format."""
+    metadata = json.loads((path / "metadata.json").read_text())
+    if metadata.get("format_version") != FORMAT_VERSION:
+        msg = (
+            f"Tree at {path} has format version {metadata.get('format_version')}, "
+            f"expected {FORMAT_VERSION}."
+        )
+        raise ValueError(msg)
+    return metadata
@@ -1,3 +1,4 @@
 from pathlib import Path
 
 DATA_PATH = Path(__file__).parent.parent.parent / Path("data")
+CACHE_PATH = DATA_PATH / Path("cache")
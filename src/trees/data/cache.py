@@ -0,0 +1,52 @@
+"""On-disk cache of datasets converted to dataframes."""
+
+import json
+import shutil
+from collections.abc import Callable
+from pathlib import Path
+
+from trees.config import CACHE_PATH
+from trees.data.registry import SourceKey
+from trees.df import FORMAT_VERSION, DataFrame
+
+
+def load_cached(
+    name: str, source_path: Path, convert: Callable[[], DataFrame], version: int = 1
+) -> DataFrame:
+    """Load a converted dataset from the cache, memory-mapped.
+
+    The dataset is converted with `convert` and written to the cache if it isn't cached yet, if
+    the content of the source file has changed since it was cached, or if it was cached by another
+    `version` of the conversion or another format version of `DataFrame.save`. Loaders must bump
+    `version` whenever they change their conversion.
+    """
+    cache_path = CACHE_PATH / name
+    key_path = cache_path / "source.json"
+    version_path = cache_path / "version.json"
+    versions = {"format_version": FORMAT_VERSION, "version": version}
+    previous = SourceKey.read(key_path)
+    key = SourceKey.from_path(source_path, previous)
+    if (
+        previous is None
+        or key.sha256 != previous.sha256
+        or _read_versions(version_path) != versions
+    ):
+        # Write next to the cache and swap it in, so readers never see a half-written cache
+        tmp_path = cache_path.with_name(f"{name}.tmp")
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        convert().save(tmp_path)
+        key.write(tmp_path / "source.json")
+        (tmp_path / "version.json").write_text(json.dumps(versions))
+        shutil.rmtree(cache_path, ignore_errors=True)
+        tmp_path.rename(cache_path)
+    elif key != previous:
+        key.write(key_path)
+    return DataFrame.load(cache_path)
+
+
+def _read_versions(version_path: Path) -> dict | None:
+    """Read the versions a dataset was cached with, if they were saved."""
+    try:
+        return json.loads(version_path.read_text())
+    except (OSError, ValueError):
+        return None
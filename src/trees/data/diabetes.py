@@ -1,12 +1,30 @@
 """Helper to load diabetes dataset."""
 
-from pathlib import Path
-
 import polars as pl
 
-from trees.config import DATA_PATH
+from trees.data.cache import load_cached
+from trees.data.registry import get_source_path, load_dataset
+from trees.df import DataFrame
+
+SOURCE_PATH = get_source_path("diabetes")
 
 
 def load_raw_data() -> pl.DataFrame:
     """Load the raw diabetes dataset."""
-    return pl.read_csv(DATA_PATH / Path("diabetes/diabetes.csv"))
+    return load_dataset("diabetes")
+
+
+def scan_raw_data() -> pl.LazyFrame:
+    """Lazily scan the raw diabetes dataset, e.g. to stream it in batches."""
+    return pl.scan_csv(SOURCE_PATH)
+
+
+def load_dataframe() -> DataFrame:
+    """Load the diabetes dataset as a dataframe, memory-mapped from the cache when possible."""
+    return load_cached(
+        "diabetes",
+        SOURCE_PATH,
+        lambda: DataFrame.from_polars(
+            load_raw_data().with_row_index(), id_col_name="index", label_col_name="Outcome"
+        ),
+    )
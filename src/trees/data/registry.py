@@ -0,0 +1,132 @@
+"""Registry of the datasets in the data directory, cached as parsed Arrow IPC files."""
+
+import hashlib
+import json
+from collections.abc import Callable
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Self
+
+import polars as pl
+
+from trees.config import CACHE_PATH, DATA_PATH
+
+PARSED_CACHE_PATH = CACHE_PATH / Path("parsed")
+_HASH_CHUNK_SIZE = 2**20
+
+
+@dataclass(frozen=True)
+class Dataset:
+    """Dataset file in the data directory and the function that parses it."""
+
+    path: Path
+    read: Callable[[Path], pl.DataFrame] = pl.read_csv
+
+    @property
+    def source_path(self) -> Path:
+        """Get the full path of the source file."""
+        return DATA_PATH / self.path
+
+
+_DATASETS: dict[str, Dataset] = {
+    "diabetes": Dataset(Path("diabetes/diabetes.csv")),
+    "titanic": Dataset(Path("titanic/train.csv")),
+    "titanic_test": Dataset(Path("titanic/test.csv")),
+}
+
+
+@dataclass(frozen=True)
+class SourceKey:
+    """Identifies the version of a source file that a parsed file was made from."""
+
+    path: str
+    mtime_ns: int
+    size: int
+    sha256: str
+
+    @classmethod
+    def from_path(cls, path: Path, previous: Self | None = None) -> Self:
+        """Get the key of a file, only hashing it if it changed since the previous key."""
+        stat = path.stat()
+        if (
+            previous is not None
+            and previous.path == str(path)
+            and previous.mtime_ns == stat.st_mtime_ns
+            and previous.size == stat.st_size
+        ):
+            sha256 = previous.sha256
+        else:
+            sha256 = _hash_file(path)
+        return cls(path=str(path), mtime_ns=stat.st_mtime_ns, size=stat.st_size, sha256=sha256)
+
+    @classmethod
+    def read(cls, key_path: Path) -> Self | None:
+        """Read a key saved with `write`, if there is a valid one."""
+        try:
+            return cls(**json.loads(key_path.read_text()))
+        except (OSError, ValueError, TypeError):
+            return None
+
+    def write(self, key_path: Path) -> None:
+        """Save the key as JSON."""
+        key_path.write_text(json.dumps(asdict(self)))
+
+
+def register_dataset(name: str, dataset: Dataset) -> None:
+    """Add a dataset to the registry, replacing any dataset with the same name."""
+    _DATASETS[name] = dataset
+
+
+def list_datasets() -> list[str]:
+    """Get the names of the registered datasets."""
+    return list(_DATASETS)
+
+
+def get_source_path(name: str) -> Path:
+    """Get the path of the source file of a registered dataset."""
+    return _get_dataset(name).source_path
+
+
+def load_dataset(name: str) -> pl.DataFrame:
+    """Load a registered dataset from its parsed Arrow IPC cache.
+
+    The source file is parsed again if it isn't cached yet or if its content has changed since it
+    was cached. The content is only hashed when the modification time or size of the source file
+    differ from the cached key, so loading an unchanged dataset never reads the source file.
+    """
+    dataset = _get_dataset(name)
+    source_path = dataset.source_path
+    if not source_path.exists():
+        msg = f"Source file {source_path} of dataset {name} not found."
+        raise FileNotFoundError(msg)
+
+    cache_path = PARSED_CACHE_PATH / f"{name}.arrow"
+    key_path = PARSED_CACHE_PATH / f"{name}.json"
+    previous = SourceKey.read(key_path)
+    key = SourceKey.from_path(source_path, previous)
+    if not cache_path.exists() or previous is None or key.sha256 != previous.sha256:
+        # Write next to the cache and swap it in, so readers never see a half-written file
+        PARSED_CACHE_PATH.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_path.with_suffix(".tmp")
+        dataset.read(source_path).write_ipc(tmp_path)
+        tmp_path.replace(cache_path)
+    if key != previous:
+        key.write(key_path)
+    return pl.read_ipc(cache_path)
+
+
+def _get_dataset(name: str) -> Dataset:
+    """Get a registered dataset by name."""
+    if name not in _DATASETS:
+        msg = f"Dataset {name} not recognized, expected one of {list_datasets()}."
+        raise KeyError(msg)
+    return _DATASETS[name]
+
+
+def _hash_file(path: Path) -> str:
+    """Get the SHA-256 hash of the content of a file."""
+    digest = hashlib.sha256()
+    with path.open("rb") as file:
+        while chunk := file.read(_HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
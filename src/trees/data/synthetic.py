@@ -0,0 +1,50 @@
+"""Synthetic binary classification datasets of any size, e.g. for benchmarks."""
+
+import numpy as np
+
+from trees.binning import BinnedFeatures
+from trees.df import DataFrame
+
+
+def make_dataframe(
+    n_rows: int,
+    n_features: int = 8,
+    cardinality: int | None = None,
+    nan_rate: float = 0.0,
+    max_bins: int | None = None,
+    seed: int | None = 0,
+) -> DataFrame:
+    """Generate a dataframe whose labels depend on a few of the features.
+
+    Features are standard normal, or take `cardinality` distinct integer values if it's given. A
+    fraction `nan_rate` of the feature values is missing. The labels are drawn from a logistic model
+    of the first half of the features. If `max_bins` is given, the features are binned as well.
+    """
+    if not 0 <= nan_rate < 1:
+        msg = f"nan_rate must be in [0, 1), got {nan_rate}."
+        raise ValueError(msg)
+    rng = np.random.default_rng(seed)
+    if cardinality is None:
+        features = rng.standard_normal((n_rows, n_features), dtype=np.float32)
+    else:
+        features = rng.integers(0, cardinality, (n_rows, n_features)).astype(np.float32)
+        features -= (cardinality - 1) / 2
+        features /= max(cardinality / 4, 1)
+
+    n_informative = max(1, n_features // 2)
+    weights = rng.standard_normal(n_informative)
+    logodds = features[:, :n_informative] @ weights
+    labels = (rng.random(n_rows) < 1 / (1 + np.exp(-logodds))).astype(np.float32)
+
+    if nan_rate > 0:
+        features[rng.random(features.shape) < nan_rate] = np.nan
+    features = np.asfortranarray(features)
+    return DataFrame(
+        ids=np.arange(n_rows),
+        features=features,
+        feature_names=[f"x{j}" for j in range(n_features)],
+        labels=labels,
+        id_col_name="index",
+        label_col_name="label",
+        bins=None if max_bins is None else BinnedFeatures.from_features(features, max_bins),
+    )
@@ -2,9 +2,43 @@
 
 import polars as pl
 
+from trees.data.cache import load_cached
+from trees.data.registry import get_source_path, load_dataset
+from trees.df import DataFrame
+
+# Free-text columns that identify passengers rather than describe them
+_DROPPED_COLUMNS = ["Name", "Ticket", "Cabin"]
+
 
 def load_raw_data() -> pl.DataFrame:
-    """Load the raw Titanic dataset."""
-    return pl.read_csv(
-        "https://raw.githubusercontent.com/datasciencedojo/datasets/master/titanic.csv"
+    """Load the raw Titanic training dataset."""
+    return load_dataset("titanic")
+
+
+def load_raw_test_data() -> pl.DataFrame:
+    """Load the raw Titanic test dataset, which has no labels."""
+    return load_dataset("titanic_test")
+
+
+def scan_raw_data() -> pl.LazyFrame:
+    """Lazily scan the raw Titanic training dataset, e.g. to stream it in batches."""
+    return pl.scan_csv(get_source_path("titanic"))
+
+
+def load_dataframe() -> DataFrame:
+    """Load the Titanic training dataset as a dataframe, memory-mapped from the cache when possible.
+
+    `Sex`, `Embarked` and `Pclass` are categorical features.
+    """
+    return load_cached(
+        "titanic",
+        get_source_path("titanic"),
+        lambda: DataFrame.from_polars(
+            load_raw_data().drop(_DROPPED_COLUMNS),
+            id_col_name="PassengerId",
+            label_col_name="Survived",
+            categorical=["Pclass"],
+        ),
+        # Bumped whenever the conversion above changes, so old caches are rebuilt
+        version=2,
     )
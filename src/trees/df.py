@@ -1,16 +1,28 @@
 """My custom dataframe class."""
 
-from dataclasses import dataclass
-from typing import Self
+import json
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Literal, Self
 
 import numpy as np
 import polars as pl
 from numpy.typing import NDArray
 
+from trees.binning import BinnedFeatures
+from trees.profiling import phase
+
+# Version of the on-disk layout written by `DataFrame.save`
+FORMAT_VERSION = 1
+
 
 @dataclass
 class DataFrame:
-    """Custom dataframe class."""
+    """Custom dataframe class.
+
+    Categorical features are stored in the feature matrix as integer codes, with NaN for missing
+    values, and `categories` maps their names to the category of each code.
+    """
 
     ids: NDArray[np.int64 | np.str_]
     features: NDArray[np.float32]
@@ -18,14 +30,41 @@ class DataFrame:
     labels: NDArray[np.float32]
     id_col_name: str
     label_col_name: str
+    bins: BinnedFeatures | None = None
+    categories: dict[str, list[str]] = field(default_factory=dict)
 
     @classmethod
-    def from_polars(cls, df: pl.DataFrame, id_col_name: str, label_col_name: str) -> Self:
-        """Convert a polars dataframe to a custom dataframe."""
+    def from_polars(
+        cls,
+        df: pl.DataFrame,
+        id_col_name: str,
+        label_col_name: str,
+        max_bins: int | None = None,
+        categorical: list[str] | None = None,
+    ) -> Self:
+        """Convert a polars dataframe to a custom dataframe.
+
+        Columns are viewed directly from their Arrow buffers where the dtypes allow it, and
+        otherwise converted one column at a time, so at most one extra column is held in memory on
+        top of the result. String and categorical columns, and the columns in `categorical`, are
+        encoded as codes of their sorted distinct values. If `max_bins` is given, the features are
+        also binned into at most that many quantile bins so that splits can be found from
+        histograms.
+        """
         feature_names = [col for col in df.columns if col not in {id_col_name, label_col_name}]
-        ids = np.array(df[id_col_name].to_numpy())
-        features = np.array(df[feature_names].cast(pl.Float32).to_numpy())
-        labels = np.array(df[label_col_name].cast(pl.Float32).to_numpy())
+        ids = df[id_col_name].to_numpy()
+        categories = {
+            name: _get_categories(df[name])
+            for name in feature_names
+            if _is_categorical(df[name].dtype) or name in (categorical or [])
+        }
+        features = _get_feature_matrix(
+            df.select(
+                _encode_categories(pl.col(name), categories[name]) if name in categories else name
+                for name in feature_names
+            )
+        )
+        labels = df[label_col_name].to_numpy().astype(np.float32, copy=False)
 
         return cls(
             ids=ids,
@@ -34,6 +73,57 @@ class DataFrame:
             labels=labels,
             id_col_name=id_col_name,
             label_col_name=label_col_name,
+            bins=None if max_bins is None else BinnedFeatures.from_features(features, max_bins),
+            categories=categories,
+        )
+
+    def save(self, path: Path) -> None:
+        """Save the dataframe as a directory of .npy files that `load` can memory-map."""
+        path.mkdir(parents=True, exist_ok=True)
+        ids = self.ids.astype(np.str_) if self.ids.dtype == np.object_ else self.ids
+        np.save(path / "ids.npy", ids)
+        np.save(path / "features.npy", self.features)
+        np.save(path / "labels.npy", self.labels)
+        if self.bins is not None:
+            np.save(path / "codes.npy", self.bins.codes)
+            np.save(path / "bin_edges.npy", self.bins.bin_edges)
+        metadata = {
+            "format_version": FORMAT_VERSION,
+            "feature_names": self.feature_names,
+            "id_col_name": self.id_col_name,
+            "label_col_name": self.label_col_name,
+            "max_bins": None if self.bins is None else self.bins.max_bins,
+            "categories": self.categories,
+        }
+        (path / "metadata.json").write_text(json.dumps(metadata))
+
+    @classmethod
+    def load(cls, path: Path, mmap: bool = True) -> Self:
+        """Load a dataframe saved with `save`, memory-mapping the arrays unless `mmap` is False."""
+        metadata = json.loads((path / "metadata.json").read_text())
+        if metadata.get("format_version") != FORMAT_VERSION:
+            msg = (
+                f"Dataframe at {path} has format version {metadata.get('format_version')}, "
+                f"expected {FORMAT_VERSION}."
+            )
+            raise ValueError(msg)
+        mmap_mode: Literal["r"] | None = "r" if mmap else None
+        max_bins = metadata["max_bins"]
+        return cls(
+            ids=np.load(path / "ids.npy", mmap_mode=mmap_mode),
+            features=np.load(path / "features.npy", mmap_mode=mmap_mode),
+            feature_names=metadata["feature_names"],
+            labels=np.load(path / "labels.npy", mmap_mode=mmap_mode),
+            id_col_name=metadata["id_col_name"],
+            label_col_name=metadata["label_col_name"],
+            bins=None
+            if max_bins is None
+            else BinnedFeatures(
+                codes=np.load(path / "codes.npy", mmap_mode=mmap_mode),
+                bin_edges=np.load(path / "bin_edges.npy"),
+                max_bins=max_bins,
+            ),
+            categories=metadata["categories"],
         )
 
     def __getitem__(self, key: str) -> NDArray[np.float32 | np.int64 | np.str_]:
@@ -47,16 +137,35 @@ class DataFrame:
         msg = f"Column {key} not found in dataframe."
         raise KeyError(msg)
 
+    def __len__(self) -> int:
+        """Get the number of rows."""
+        return self.labels.shape[0]
+
+    def is_categorical(self, feature_name: str) -> bool:
+        """Check if a feature is categorical."""
+        return feature_name in self.categories
+
     def get_rows_by_ids(self, ids: NDArray[np.int64 | np.str_]) -> "DataFrame":
         """Get rows by their ids."""
-        mask = np.isin(self.ids, ids)
+        with phase("DataFrame.get_rows_by_ids", len(self)):
+            mask = np.isin(self.ids, ids)
+            return self.take(mask)
+
+    def take(self, rows: NDArray[np.bool_ | np.intp]) -> "DataFrame":
+        """Get the rows selected by a mask or an array of row positions.
+
+        Selecting by row positions only touches the selected rows, so the cost scales with the
+        number of rows selected rather than the size of the dataframe.
+        """
         return DataFrame(
-            ids=self.ids[mask],
-            features=self.features[mask],
+            ids=self.ids[rows],
+            features=self.features[rows],
             feature_names=self.feature_names,
-            labels=self.labels[mask],
+            labels=self.labels[rows],
             id_col_name=self.id_col_name,
             label_col_name=self.label_col_name,
+            bins=None if self.bins is None else self.bins.take(rows),
+            categories=self.categories,
         )
 
     def __add__(self, other: object) -> "DataFrame":
@@ -73,6 +182,9 @@ class DataFrame:
         if self.label_col_name != other.label_col_name:
             msg = "Label column names must match to concatenate DataFrames."
             raise ValueError(msg)
+        if self.categories != other.categories:
+            msg = "Categories must match to concatenate DataFrames."
+            raise ValueError(msg)
         return DataFrame(
             ids=np.concatenate([self.ids, other.ids]),
             features=np.concatenate([self.features, other.features]),
@@ -80,51 +192,65 @@ class DataFrame:
             labels=np.concatenate([self.labels, other.labels]),
             id_col_name=self.id_col_name,
             label_col_name=self.label_col_name,
+            bins=None if self.bins is None or other.bins is None else self.bins + other.bins,
+            categories=self.categories,
         )
 
     def filter_to_below_threshold(self, feature_name: str, threshold: float) -> "DataFrame":
         """Filter the dataset to only include rows where the feature is below the threshold."""
         mask = self.features[:, self.feature_names.index(feature_name)] < threshold
-        return DataFrame(
-            ids=self.ids[mask],
-            features=self.features[mask],
-            feature_names=self.feature_names,
-            labels=self.labels[mask],
-            id_col_name=self.id_col_name,
-            label_col_name=self.label_col_name,
-        )
+        return self.take(mask)
 
     def filter_to_above_or_at_threshold(self, feature_name: str, threshold: float) -> "DataFrame":
         """Filter dataset to only include rows where the feature is at or above the threshold."""
         mask = self.features[:, self.feature_names.index(feature_name)] >= threshold
-        return DataFrame(
-            ids=self.ids[mask],
-            features=self.features[mask],
-            feature_names=self.feature_names,
-            labels=self.labels[mask],
-            id_col_name=self.id_col_name,
-            label_col_name=self.label_col_name,
-        )
+        return self.take(mask)
 
     def filter_to_nulls(self, feature_name: str) -> "DataFrame":
         """Filter dataset to only include rows where the feature is null."""
         mask = np.isnan(self.features[:, self.feature_names.index(feature_name)])
-        return DataFrame(
-            ids=self.ids[mask],
-            features=self.features[mask],
-            feature_names=self.feature_names,
-            labels=self.labels[mask],
-            id_col_name=self.id_col_name,
-            label_col_name=self.label_col_name,
-        )
+        return self.take(mask)
 
     def get_logodds(self) -> float:
         """Get the log odds of the target variable."""
-        if self.labels.shape[0] == 0:
-            return float("nan")
-
-        if self.labels.mean() == 0:
-            return -100
-        if self.labels.mean() == 1:
-            return 100
-        return np.log(self.labels.mean() / (1 - self.labels.mean()))
+        return get_logodds(self.labels)
+
+
+def _get_feature_matrix(df: pl.DataFrame) -> NDArray[np.float32]:
+    """Get the columns of a polars dataframe as a column-major float32 matrix."""
+    if all(dtype == pl.Float32 for dtype in df.dtypes):
+        try:
+            return df.to_numpy(order="fortran", allow_copy=False)
+        except RuntimeError:
+            pass  # Nulls or separate column buffers, fall back to copying
+    features = np.empty(df.shape, dtype=np.float32, order="F")
+    for j, column in enumerate(df.iter_columns()):
+        features[:, j] = column.to_numpy()
+    return features
+
+
+def _is_categorical(dtype: pl.DataType) -> bool:
+    """Check if a polars dtype holds categories rather than numbers."""
+    return dtype == pl.String or dtype == pl.Categorical or isinstance(dtype, pl.Enum)
+
+
+def _get_categories(column: pl.Series) -> list[str]:
+    """Get the sorted distinct values of a column as strings."""
+    return sorted(column.drop_nulls().cast(pl.String).unique().to_list())
+
+
+def _encode_categories(column: pl.Expr, categories: list[str]) -> pl.Expr:
+    """Get the codes of the values of a column in its categories, keeping nulls."""
+    return column.cast(pl.String).cast(pl.Enum(categories)).to_physical()
+
+
+def get_logodds(labels: NDArray[np.float32]) -> float:
+    """Get the log odds of binary labels."""
+    if labels.shape[0] == 0:
+        return float("nan")
+
+    if labels.mean() == 0:
+        return -100
+    if labels.mean() == 1:
+        return 100
+    return np.log(labels.mean() / (1 - labels.mean()))
@@ -0,0 +1,190 @@
+"""Gradient-boosted ensembles of decision trees."""
+
+import json
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from typing import Self
+
+import numpy as np
+from numpy.typing import NDArray
+
+from trees.binning import MAX_BINS_UINT8, BinnedFeatures
+from trees.compiled import FORMAT_VERSION, CompiledTree, read_metadata
+from trees.df import DataFrame
+from trees.parallel import HistogramPool
+from trees.splitting.xgb import NewtonGain
+from trees.tree import Tree
+
+# Keeps the Newton targets finite for rows the ensemble is already certain about
+_MIN_HESSIAN = 1e-12
+
+
+@dataclass
+class Ensemble:
+    """Gradient-boosted ensemble of trees for binary classification with log-loss.
+
+    The leaves of each tree hold the log odds it adds to the prediction of the trees before it. Only
+    the compiled form of each tree is kept.
+    """
+
+    trees: list[CompiledTree] = field(default_factory=list)
+    base_logodds: float = 0.0
+
+    @classmethod
+    def fit(
+        cls,
+        df: DataFrame,
+        valid: DataFrame | None = None,
+        n_trees: int = 100,
+        learning_rate: float = 0.1,
+        max_depth: int = 3,
+        min_child_weight: float = 1.0,
+        reg_lambda: float = 1.0,
+        gamma: float = 0.0,
+        early_stopping_rounds: int | None = 10,
+        max_bins: int = MAX_BINS_UINT8,
+        n_workers: int = 1,
+    ) -> Self:
+        """Fit trees one after the other to the gradients of the log-loss.
+
+        The features are binned once for all trees, and all trees are grown on one pool of
+        `n_workers` workers, so the bin codes are only shared with them once. The log odds of the
+        training rows are updated in place from the leaves each tree puts them in, without
+        predicting with the ensemble. If a validation dataframe is given, training stops once its
+        log-loss hasn't improved for `early_stopping_rounds` trees and the ensemble is cut back to
+        the best number of trees.
+        """
+        if valid is not None and valid.feature_names != df.feature_names:
+            msg = "Validation features must match the training features."
+            raise ValueError(msg)
+        bins = (
+            df.bins if df.bins is not None else BinnedFeatures.from_features(df.features, max_bins)
+        )
+        df = replace(df, bins=bins)
+
+        ensemble = cls(base_logodds=float(df.get_logodds()))
+        labels = df.labels.astype(np.float64)
+        logodds = np.full(len(df), ensemble.base_logodds)
+        probabilities = np.empty_like(logodds)
+        gradients = np.empty_like(logodds)
+        hessians = np.empty_like(logodds)
+        targets = np.empty_like(logodds)
+        valid_logodds = None if valid is None else np.full(len(valid), ensemble.base_logodds)
+        best_loss, best_n_trees = np.inf, 0
+        criterion = NewtonGain(reg_lambda=reg_lambda, gamma=gamma)
+
+        # One pool for all the trees, so the bin codes are only shared with the workers once
+        with HistogramPool(bins.codes, targets, bins.max_bins, n_workers, weights=hessians) as pool:
+            for _ in range(n_trees):
+                _sigmoid(logodds, out=probabilities)
+                np.subtract(probabilities, labels, out=gradients)
+                np.multiply(probabilities, 1 - probabilities, out=hessians)
+                np.maximum(hessians, _MIN_HESSIAN, out=hessians)
+                np.divide(gradients, hessians, out=targets)
+                np.negative(targets, out=targets)
+
+                tree = Tree.from_dataframe(df)
+                tree.fit(
+                    max_depth=max_depth,
+                    min_samples_leaf=min_child_weight,
+                    criterion=criterion,
+                    targets=targets,
+                    sample_weight=hessians,
+                    pool=pool,
+                )
+                for leaf in tree.root.leaves:
+                    rows = leaf.row_indices
+                    value = (
+                        -learning_rate * gradients[rows].sum() / (hessians[rows].sum() + reg_lambda)
+                    )
+                    tree.set_node_logodds(leaf.id, value)
+                    logodds[rows] += value
+                # Only keep the compiled tree, so the tree and its partition of the rows are freed
+                compiled = tree.compiled
+                ensemble.trees.append(compiled)
+
+                if valid is None or valid_logodds is None:
+                    continue
+                valid_logodds += compiled.predict(valid.features)
+                loss = _log_loss(valid.labels, valid_logodds)
+                if loss < best_loss:
+                    best_loss, best_n_trees = loss, len(ensemble.trees)
+                elif (
+                    early_stopping_rounds is not None
+                    and len(ensemble.trees) - best_n_trees >= early_stopping_rounds
+                ):
+                    break
+
+        if valid is not None:
+            del ensemble.trees[best_n_trees:]
+        return ensemble
+
+    def predict(self, features: NDArray[np.float32]) -> NDArray[np.float64]:
+        """Predict the log odds for each row of the feature matrix."""
+        features = np.atleast_2d(features)
+        logodds = np.full(features.shape[0], self.base_logodds)
+        for tree in self.trees:
+            logodds += tree.predict(features)
+        return logodds
+
+    def save(self, path: Path) -> None:
+        """Save the trees in numbered subdirectories, for `CompiledEnsemble.load`."""
+        CompiledEnsemble(
+            trees=self.trees,
+            base_logodds=self.base_logodds,
+            feature_names=self.trees[0].feature_names if self.trees else [],
+        ).save(path)
+
+
+@dataclass
+class CompiledEnsemble:
+    """Gradient-boosted ensemble kept only in compiled form, e.g. for scoring."""
+
+    trees: list[CompiledTree]
+    base_logodds: float = 0.0
+    feature_names: list[str] = field(default_factory=list)
+
+    def save(self, path: Path) -> None:
+        """Save the trees in numbered subdirectories that `load` can memory-map."""
+        path.mkdir(parents=True, exist_ok=True)
+        for i, tree in enumerate(self.trees):
+            tree.save(path / f"tree_{i}")
+        metadata = {
+            "format_version": FORMAT_VERSION,
+            "n_trees": len(self.trees),
+            "base_logodds": self.base_logodds,
+            "n_features": len(self.feature_names),
+            "feature_names": self.feature_names,
+        }
+        (path / "metadata.json").write_text(json.dumps(metadata))
+
+    @classmethod
+    def load(cls, path: Path, mmap: bool = True) -> Self:
+        """Load an ensemble saved with `save`, memory-mapping the arrays unless `mmap` is False."""
+        metadata = read_metadata(path)
+        return cls(
+            trees=[CompiledTree.load(path / f"tree_{i}", mmap) for i in range(metadata["n_trees"])],
+            base_logodds=metadata["base_logodds"],
+            feature_names=metadata["feature_names"],
+        )
+
+    def predict(self, features: NDArray[np.float32]) -> NDArray[np.float64]:
+        """Predict the log odds for each row of the feature matrix."""
+        features = np.atleast_2d(features)
+        logodds = np.full(features.shape[0], self.base_logodds)
+        for tree in self.trees:
+            logodds += tree.predict(features)
+        return logodds
+
+
+def _sigmoid(logodds: NDArray[np.float64], out: NDArray[np.float64]) -> NDArray[np.float64]:
+    """Convert log odds to probabilities without allocating."""
+    np.negative(logodds, out=out)
+    np.exp(out, out=out)
+    out += 1
+    return np.reciprocal(out, out=out)
+
+
+def _log_loss(labels: NDArray[np.float32], logodds: NDArray[np.float64]) -> float:
+    """Get the mean log-loss of log odds predictions."""
+    return float(np.mean(np.logaddexp(0, logodds) - labels * logodds))
@@ -0,0 +1,62 @@
+"""Conversion of trees to bigtree nodes, for displaying and exporting them.
+
+bigtree is an optional dependency, installed with the `display` extra.
+"""
+
+from typing import TYPE_CHECKING
+
+from trees.node import Node
+
+if TYPE_CHECKING:
+    from bigtree import BinaryNode
+
+DEFAULT_ATTRIBUTES = [
+    "n_obs",
+    "feature_name",
+    "threshold",
+    "categories",
+    "missing_right",
+    "logodds",
+]
+
+
+def to_bigtree(root: Node, attr_list: list[str] | None = None) -> "BinaryNode":
+    """Copy the tree below a node to bigtree binary nodes named by the node ids.
+
+    Each bigtree node gets the attributes in `attr_list` of the node it copies, by default the
+    number of observations, the split and the log odds.
+    """
+    try:
+        from bigtree import BinaryNode
+    except ImportError as e:
+        msg = (
+            "bigtree is needed to display or export trees, "
+            "install it with the display extra: pip install 'trees[display]'."
+        )
+        raise ImportError(msg) from e
+
+    attr_list = DEFAULT_ATTRIBUTES if attr_list is None else attr_list
+
+    def copy(node: Node, parent: BinaryNode | None) -> BinaryNode:
+        """Copy one node, without its children."""
+        attributes = {attr: getattr(node, attr) for attr in attr_list}
+        return BinaryNode(name=str(node.id), parent=parent, **attributes)
+
+    bigtree_root = copy(root, None)
+    stack = [(root, bigtree_root)]
+    while stack:
+        node, bigtree_node = stack.pop()
+        for child, side in ((node.left, "left"), (node.right, "right")):
+            if child is not None:
+                bigtree_child = copy(child, None)
+                setattr(bigtree_node, side, bigtree_child)
+                stack.append((child, bigtree_child))
+    return bigtree_root
+
+
+def to_dict(root: Node, attr_list: list[str] | None = None) -> dict[str, dict]:
+    """Export the tree below a node as a dict from bigtree path to node attributes."""
+    bigtree_root = to_bigtree(root, attr_list)
+    from bigtree import tree_to_dict
+
+    return tree_to_dict(bigtree_root, all_attrs=True)
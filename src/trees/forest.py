@@ -0,0 +1,184 @@
+"""Random forests of decision trees."""
+
+import math
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field, replace
+from functools import partial
+from typing import Self
+
+import numpy as np
+from numpy.typing import NDArray
+
+from trees.binning import MAX_BINS_UINT8, BinnedFeatures
+from trees.compiled import CompiledTree
+from trees.df import DataFrame
+from trees.parallel import PROCESS_CONTEXT, SharedArrays, SharedArraySpec, attach_shared_array
+from trees.splitting.criterion import SplitCriterion
+from trees.splitting.gini import gini_gain
+from trees.tree import Tree
+
+
+@dataclass(frozen=True)
+class _TreeParams:
+    """Settings shared by every tree of a forest."""
+
+    max_depth: int
+    min_samples_leaf: int
+    max_features: int
+    criterion: SplitCriterion
+
+
+@dataclass(frozen=True)
+class _SharedDataFrame:
+    """A binned dataframe with its large arrays in shared memory."""
+
+    features: SharedArraySpec
+    labels: SharedArraySpec
+    codes: SharedArraySpec
+    bin_edges: NDArray[np.float32]
+    max_bins: int
+    feature_names: list[str]
+    categories: dict[str, list[str]]
+
+    @classmethod
+    def share(cls, df: DataFrame, bins: BinnedFeatures, shared_arrays: SharedArrays) -> Self:
+        """Put the arrays a tree is grown from in shared memory."""
+        return cls(
+            features=shared_arrays.share(df.features),
+            labels=shared_arrays.share(df.labels),
+            codes=shared_arrays.share(bins.codes),
+            bin_edges=bins.bin_edges,
+            max_bins=bins.max_bins,
+            feature_names=df.feature_names,
+            categories=df.categories,
+        )
+
+    def attach(self) -> DataFrame:
+        """Rebuild the dataframe from shared memory, with row positions as ids."""
+        labels = attach_shared_array(self.labels)
+        return DataFrame(
+            ids=np.arange(len(labels)),
+            features=attach_shared_array(self.features),
+            feature_names=self.feature_names,
+            labels=labels,
+            id_col_name="index",
+            label_col_name="label",
+            bins=BinnedFeatures(
+                codes=attach_shared_array(self.codes),
+                bin_edges=self.bin_edges,
+                max_bins=self.max_bins,
+            ),
+            categories=self.categories,
+        )
+
+
+# Set in each worker process by `_attach_worker`
+_worker_df: DataFrame | None = None
+
+
+@dataclass
+class RandomForest:
+    """Bagged ensemble of trees, each grown on a bootstrap sample and a subset of the features.
+
+    Only the compiled form of each tree is kept.
+    """
+
+    trees: list[CompiledTree] = field(default_factory=list)
+
+    @classmethod
+    def fit(
+        cls,
+        df: DataFrame,
+        n_trees: int = 100,
+        max_depth: int = 8,
+        min_samples_leaf: int = 1,
+        max_features: int | None = None,
+        criterion: SplitCriterion = gini_gain,
+        max_bins: int = MAX_BINS_UINT8,
+        n_workers: int = 1,
+        seed: int | None = None,
+    ) -> Self:
+        """Fit trees independently, spread over `n_workers` processes.
+
+        Each tree sees a bootstrap sample of the rows, drawn as row indices into the shared
+        dataframe, and `max_features` randomly chosen features (the square root of the number of
+        features by default). Features are sampled once per tree rather than per split, and each
+        tree only builds histograms for its own features. The features are binned once and, with
+        more than one worker, the dataframe is put in shared memory once instead of being sent with
+        every tree. The forest only depends on the seed, not on the number of workers.
+        """
+        bins = (
+            df.bins if df.bins is not None else BinnedFeatures.from_features(df.features, max_bins)
+        )
+        df = replace(df, bins=bins)
+        params = _TreeParams(
+            max_depth=max_depth,
+            min_samples_leaf=min_samples_leaf,
+            max_features=max_features or max(1, round(math.sqrt(len(df.feature_names)))),
+            criterion=criterion,
+        )
+        seeds = np.random.SeedSequence(seed).spawn(n_trees)
+
+        if n_workers == 1:
+            return cls(trees=[_fit_tree(df, params, tree_seed) for tree_seed in seeds])
+
+        with (
+            SharedArrays() as shared_arrays,
+            ProcessPoolExecutor(
+                max_workers=n_workers,
+                mp_context=PROCESS_CONTEXT,
+                initializer=_attach_worker,
+                initargs=(_SharedDataFrame.share(df, bins, shared_arrays),),
+            ) as executor,
+        ):
+            trees = list(executor.map(partial(_fit_tree_in_worker, params), seeds))
+        return cls(trees=trees)
+
+    def predict_proba(self, features: NDArray[np.float32]) -> NDArray[np.float64]:
+        """Predict the probability of the positive label by averaging over the trees."""
+        features = np.atleast_2d(features)
+        probabilities = np.zeros(features.shape[0])
+        for tree in self.trees:
+            probabilities += 1 / (1 + np.exp(-tree.predict(features)))
+        return probabilities / len(self.trees)
+
+    def predict(self, features: NDArray[np.float32]) -> NDArray[np.float64]:
+        """Predict the log odds of the averaged probabilities."""
+        probabilities = self.predict_proba(features)
+        with np.errstate(divide="ignore"):
+            return np.log(probabilities) - np.log1p(-probabilities)
+
+
+def _fit_tree(df: DataFrame, params: _TreeParams, seed: np.random.SeedSequence) -> CompiledTree:
+    """Grow one tree of the forest on a bootstrap sample and random features."""
+    rng = np.random.default_rng(seed)
+    bootstrap = rng.integers(0, len(df), size=len(df))
+    feature_names = list(
+        rng.choice(
+            df.feature_names,
+            size=min(params.max_features, len(df.feature_names)),
+            replace=False,
+        )
+    )
+    tree = Tree.from_dataframe(df, row_indices=bootstrap)
+    tree.fit(
+        max_depth=params.max_depth,
+        min_samples_leaf=params.min_samples_leaf,
+        criterion=params.criterion,
+        feature_names=feature_names,
+    )
+    return tree.compiled
+
+
+def _attach_worker(shared_df: _SharedDataFrame) -> None:
+    """Attach a worker process to the shared dataframe."""
+    global _worker_df
+    _worker_df = shared_df.attach()
+
+
+def _fit_tree_in_worker(params: _TreeParams, seed: np.random.SeedSequence) -> CompiledTree:
+    """Grow one tree of the forest in a worker process."""
+    if _worker_df is None:
+        msg = "Worker process is not attached to the shared dataset."
+        raise RuntimeError(msg)
+    return _fit_tree(_worker_df, params, seed)
@@ -0,0 +1,230 @@
+"""Undo, redo and named snapshots of the edits of a tree.
+
+Every split or deletion made through a `TreeHistory` creates a new version of the tree. Versions
+don't copy the tree: an edit only records the split of the node it changed before and after, and
+the detached subtrees are kept as they are, so going back to a version reattaches the same nodes
+instead of searching for their splits again. Their cached statistics are kept too, since the tree
+caches them by node id and ids are never reused.
+
+Splits reorder the rows of a node in the partition shared by the whole tree, which the ranges of
+its descendants depend on. Rather than keeping a copy of the rows of every edited node, a restored
+subtree partitions its rows between its children again. Moving between versions costs the size of
+the changed subtrees and their rows, whatever the size of the rest of the tree, and the history only
+holds nodes, however many rows they have.
+"""
+
+from collections.abc import Collection
+from dataclasses import dataclass
+
+from trees.node import Node
+from trees.profiling import phase
+from trees.tree import Tree
+
+
+@dataclass(frozen=True)
+class _NodeState:
+    """The split of a node at one version of the tree."""
+
+    node: Node
+    feature_name: str
+    threshold: float
+    categories: frozenset[int] | None
+    missing_right: bool
+    left: Node | None
+    right: Node | None
+
+    @classmethod
+    def capture(cls, node: Node | None) -> "_NodeState | None":
+        """Get the current state of a node, or None if there is no node."""
+        if node is None:
+            return None
+        return cls(
+            node=node,
+            feature_name=node.feature_name,
+            threshold=node.threshold,
+            categories=node.categories,
+            missing_right=node.missing_right,
+            left=node.left,
+            right=node.right,
+        )
+
+    def restore(self) -> Node:
+        """Put the node back in this state, and get it."""
+        node = self.node
+        node.feature_name = self.feature_name
+        node.threshold = self.threshold
+        node.categories = self.categories
+        node.missing_right = self.missing_right
+        node.left = self.left
+        node.right = self.right
+        for child in node.children:
+            child.parent = node
+        return node
+
+
+@dataclass(frozen=True)
+class _Edit:
+    """A change of the subtree at one position of the tree.
+
+    The position is the root if `parent` is None, and a child of `parent` otherwise. A state of None
+    means that there is no node at the position.
+    """
+
+    node_id: int
+    parent: Node | None
+    is_left: bool
+    before: _NodeState | None
+    after: _NodeState | None
+
+
+@dataclass(frozen=True)
+class _Version:
+    """A version of the tree, reached from its parent version by one edit."""
+
+    parent: "_Version | None" = None
+    edit: _Edit | None = None
+    n_edits: int = 0
+
+
+class TreeHistory:
+    """Versions of a tree, edited through the history.
+
+    Versions form a tree of their own: an edit made after an undo starts a new branch, and the
+    redo steps of the old branch are dropped unless a snapshot still refers to them. The tree must
+    only be edited through the history for the versions to stay consistent.
+    """
+
+    def __init__(self, tree: Tree) -> None:
+        self.tree = tree
+        self._version = _Version()
+        self._redo: list[_Version] = []
+        self._snapshots: dict[str, _Version] = {}
+
+    @property
+    def can_undo(self) -> bool:
+        """Check if there is an edit to undo."""
+        return self._version.edit is not None
+
+    @property
+    def can_redo(self) -> bool:
+        """Check if there is an undone edit to redo."""
+        return bool(self._redo)
+
+    @property
+    def undo_node_id(self) -> int | None:
+        """Get the id of the node whose subtree the next undo changes."""
+        return self._version.edit.node_id if self._version.edit is not None else None
+
+    @property
+    def redo_node_id(self) -> int | None:
+        """Get the id of the node whose subtree the next redo changes."""
+        return self._redo[-1].edit.node_id if self._redo and self._redo[-1].edit else None
+
+    @property
+    def snapshot_names(self) -> list[str]:
+        """Get the names of the saved snapshots, oldest first."""
+        return list(self._snapshots)
+
+    def split_node(
+        self,
+        node_id: int,
+        feature_name: str,
+        threshold: float = float("nan"),
+        categories: Collection[int] | None = None,
+        missing_right: bool = False,
+    ) -> None:
+        """Split a node as in `Tree.split_node`, as a new version of the tree."""
+        node = self.tree.get_node_by_id(node_id)
+        before = _NodeState.capture(node)
+        self.tree.split_node(node_id, feature_name, threshold, categories, missing_right)
+        self._add_edit(
+            _Edit(node_id, node.parent, node.is_left_child, before, _NodeState.capture(node))
+        )
+
+    def delete_node(self, node_id: int, make_new_leaf: bool = True) -> None:
+        """Delete a node as in `Tree.delete_node`, as a new version of the tree."""
+        node = self.tree.get_node_by_id(node_id)
+        parent, is_left = node.parent, node.is_left_child
+        before = _NodeState.capture(node)
+        self.tree.delete_node(node_id, make_new_leaf)
+        # Deleting the root fails above, so the node has a parent
+        after = _NodeState.capture(parent.left if is_left else parent.right)
+        self._add_edit(_Edit(node_id, parent, is_left, before, after))
+
+    def undo(self) -> int:
+        """Go back to the version before the last edit, and get the id of the edited node."""
+        edit = self._version.edit
+        if edit is None or self._version.parent is None:
+            msg = "Nothing to undo."
+            raise ValueError(msg)
+        self._apply(edit, edit.before)
+        self._redo.append(self._version)
+        self._version = self._version.parent
+        return edit.node_id
+
+    def redo(self) -> int:
+        """Redo the last undone edit, and get the id of the edited node."""
+        edit = self._redo[-1].edit if self._redo else None
+        if edit is None:
+            msg = "Nothing to redo."
+            raise ValueError(msg)
+        self._apply(edit, edit.after)
+        self._version = self._redo.pop()
+        return edit.node_id
+
+    def save_snapshot(self, name: str) -> None:
+        """Name the current version, to go back to it with `restore_snapshot`."""
+        self._snapshots[name] = self._version
+
+    def restore_snapshot(self, name: str) -> None:
+        """Go to a named version, through the closest version it shares with the current one.
+
+        The redo steps are dropped, since they belong to the branch that was left.
+        """
+        target = self._snapshots.get(name)
+        if target is None:
+            msg = f"Snapshot {name} not found."
+            raise KeyError(msg)
+
+        # Undo up to the common ancestor, then redo down from it
+        current = self._version
+        redo_path = []
+        while current is not target:
+            if current.n_edits >= target.n_edits:
+                self._apply(current.edit, current.edit.before)
+                current = current.parent
+            else:
+                redo_path.append(target)
+                target = target.parent
+        for version in reversed(redo_path):
+            self._apply(version.edit, version.edit.after)
+        self._version = self._snapshots[name]
+        self._redo.clear()
+
+    def _add_edit(self, edit: _Edit) -> None:
+        """Make the version after an edit the current one."""
+        self._version = _Version(self._version, edit, self._version.n_edits + 1)
+        self._redo.clear()
+
+    def _apply(self, edit: _Edit, state: _NodeState | None) -> None:
+        """Put the position changed by an edit in one of its states."""
+        parent = edit.parent
+        if parent is None:
+            current = self.tree.root
+        else:
+            current = parent.left if edit.is_left else parent.right
+        removed = [] if current is None else [current, *current.descendants]
+        with phase("TreeHistory.apply", len(removed)):
+            node = None if state is None else state.restore()
+            if current is not None and current is not node:
+                current.parent = None
+            if parent is not None:
+                if edit.is_left:
+                    parent.left = node
+                else:
+                    parent.right = node
+            if node is not None:
+                node.parent = parent
+                # Other splits of the node may have reordered the rows its subtree relies on
+                node.repartition(self.tree.df)
+            self.tree.update_index(removed, node)
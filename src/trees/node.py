@@ -1,42 +1,85 @@
 """Tree nodes."""
 
-import uuid
-from typing import Any, TypeVar
+from collections.abc import Iterator
 
 import numpy as np
-from bigtree.node.binarynode import BinaryNode
 from numpy.typing import NDArray
-from PIL.ImageChops import offset
 
-from trees.df import DataFrame
+from trees.df import DataFrame, get_logodds
+from trees.partition import RowPartition
+from trees.profiling import phase
 
 
-class Node(BinaryNode):
-    """Tree node."""
+class Node:
+    """Tree node.
+
+    The rows of a node are the range `[start, end)` of a row partition shared with the rest of its
+    tree. Nodes have fixed slots and integer ids to stay small in large trees and ensembles; use
+    `trees.export` to convert them to bigtree for display.
+
+    Splits on a numerical feature send rows with a value at or above `threshold` to the right
+    child. Splits on a categorical feature have a NaN threshold and send the rows whose category
+    code is in `categories` to the right child. Rows with a missing value go right if
+    `missing_right` is set and left otherwise.
+    """
+
+    __slots__ = (
+        "categories",
+        "end",
+        "feature_name",
+        "id",
+        "left",
+        "logodds",
+        "missing_right",
+        "parent",
+        "partition",
+        "right",
+        "start",
+        "threshold",
+    )
 
     def __init__(
         self,
-        name: str | int,
+        node_id: int,
         parent: "Node | None" = None,
         left: "Node | None" = None,
         right: "Node | None" = None,
         feature_name: str = "[feature_name]",
         threshold: float | None = None,
-        data_ids: NDArray[np.str_ | np.int_] | None = None,
+        partition: RowPartition | None = None,
+        start: int = 0,
+        end: int | None = None,
         logodds: float | None = None,
+        categories: frozenset[int] | None = None,
+        missing_right: bool = False,
     ):
-        super().__init__(name=name, parent=parent, left=left, right=right)
+        self.id: int = node_id
+        self.parent: Node | None = parent
+        self.left: Node | None = left
+        self.right: Node | None = right
         self.feature_name: str = feature_name
-        self.threshold: float = threshold or float("nan")
-        self.data_ids: NDArray[np.str_ | np.int_] = (
-            np.array([], dtype=np.str_) if data_ids is None else data_ids
+        self.threshold: float = float("nan") if threshold is None else threshold
+        self.partition: RowPartition = (
+            RowPartition(np.array([], dtype=np.intp)) if partition is None else partition
         )
-        self.logodds: float = logodds or float("nan")
+        self.start: int = start
+        self.end: int = len(self.partition) if end is None else end
+        self.logodds: float = float("nan") if logodds is None else logodds
+        self.categories: frozenset[int] | None = categories
+        self.missing_right: bool = missing_right
+
+    def __repr__(self) -> str:
+        return f"Node(id={self.id}, n_obs={self.n_obs}, logodds={self.logodds:.3f})"
 
     @property
-    def id(self) -> str:
-        """Get the node id."""
-        return self.name
+    def is_root(self) -> bool:
+        """Check if the node is the root of its tree."""
+        return self.parent is None
+
+    @property
+    def is_leaf(self) -> bool:
+        """Check if the node has no children."""
+        return self.left is None and self.right is None
 
     @property
     def is_left_child(self) -> bool:
@@ -53,10 +96,55 @@ class Node(BinaryNode):
         """Check if the node is split."""
         return self.left is not None or self.right is not None
 
+    @property
+    def children(self) -> list["Node"]:
+        """Get the children of the node."""
+        return [child for child in (self.left, self.right) if child is not None]
+
+    @property
+    def depth(self) -> int:
+        """Get the number of splits between the root and the node."""
+        depth = 0
+        node = self
+        while node.parent is not None:
+            node = node.parent
+            depth += 1
+        return depth
+
+    @property
+    def descendants(self) -> Iterator["Node"]:
+        """Iterate over the nodes below this one, parents before their children."""
+        stack = self.children[::-1]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(node.children[::-1])
+
+    @property
+    def leaves(self) -> Iterator["Node"]:
+        """Iterate over the leaves below this node, or the node itself if it's a leaf."""
+        if self.is_leaf:
+            yield self
+        for node in self.descendants:
+            if node.is_leaf:
+                yield node
+
+    @property
+    def row_indices(self) -> NDArray[np.intp]:
+        """Get the rows of the dataset in the node, as a view into the partition."""
+        return self.partition.get_rows(self.start, self.end)
+
     @property
     def n_obs(self) -> int:
         """Get the number of observations in the node."""
-        return len(self.data_ids)
+        return self.end - self.start
+
+    def show(self, attr_list: list[str] | None = None) -> None:
+        """Print the tree below this node, using bigtree from the `display` extra."""
+        from trees.export import DEFAULT_ATTRIBUTES, to_bigtree
+
+        attr_list = DEFAULT_ATTRIBUTES if attr_list is None else attr_list
+        to_bigtree(self, attr_list).show(attr_list=attr_list)
 
     def split(
         self,
@@ -64,37 +152,75 @@ class Node(BinaryNode):
         threshold: float,
         df: DataFrame,
         *,
-        left_id: str | None = None,
-        right_id: str | None = None,
+        left_id: int,
+        right_id: int,
+        categories: frozenset[int] | None = None,
+        missing_right: bool = False,
     ) -> None:
-        """Split the node based on feature and threshold."""
-        if self.is_split:
-            msg = "Node already split."
-            raise ValueError(msg)
+        """Split the node based on feature and threshold, or on the categories to send right.
 
-        if left_id is None:
-            left_id = uuid.uuid4().hex
-        if right_id is None:
-            right_id = uuid.uuid4().hex
+        `df` is the full dataset that the row indices of the node point into. The rows of the node
+        are partitioned in place between its children in a single pass, with rows missing the
+        feature going right if `missing_right` is set.
+        """
+        with phase("Node.split", self.n_obs):
+            if self.is_split:
+                msg = "Node already split."
+                raise ValueError(msg)
+            if df.is_categorical(feature_name) != (categories is not None):
+                msg = f"Splits on {feature_name} need categories if and only if it's categorical."
+                raise ValueError(msg)
+            if categories is not None and not categories:
+                msg = f"Splits on {feature_name} need at least one category to send right."
+                raise ValueError(msg)
+            if categories is None and np.isnan(threshold):
+                msg = f"Splits on {feature_name} need a threshold, got NaN."
+                raise ValueError(msg)
 
-        self.feature_name = feature_name
-        self.threshold = threshold
-        left_dataset = df.filter_to_below_threshold(feature_name, threshold) + df.filter_to_nulls(
-            feature_name
-        )
-        right_dataset = df.filter_to_above_or_at_threshold(feature_name, threshold)
-        self.left: Node = Node(
-            name=left_id,
-            parent=self,
-            data_ids=left_dataset.ids,
-            logodds=left_dataset.get_logodds(),
-        )
-        self.right: Node = Node(
-            name=right_id,
-            parent=self,
-            data_ids=right_dataset.ids,
-            logodds=right_dataset.get_logodds(),
-        )
+            self.feature_name = feature_name
+            self.threshold = threshold if categories is None else float("nan")
+            self.categories = categories
+            self.missing_right = missing_right
+            mid = self.partition.partition(self.start, self.end, self._goes_right(df))
+            self.left = Node(
+                left_id,
+                parent=self,
+                partition=self.partition,
+                start=self.start,
+                end=mid,
+                logodds=get_logodds(df.labels[self.partition.get_rows(self.start, mid)]),
+            )
+            self.right = Node(
+                right_id,
+                parent=self,
+                partition=self.partition,
+                start=mid,
+                end=self.end,
+                logodds=get_logodds(df.labels[self.partition.get_rows(mid, self.end)]),
+            )
+
+    def repartition(self, df: DataFrame) -> None:
+        """Partition the rows of each split node of the subtree between its children again.
+
+        Puts back the order of the rows that the ranges of the subtree rely on, e.g. after the rows
+        were reordered by another split of the node. Each range keeps the same rows, so the ranges
+        themselves don't change.
+        """
+        with phase("Node.repartition", self.n_obs):
+            for node in [self, *self.descendants]:
+                if node.is_split:
+                    node.partition.partition(node.start, node.end, node._goes_right(df))
+
+    def _goes_right(self, df: DataFrame) -> NDArray[np.bool_]:
+        """Get whether the split of the node sends each of its rows to the right child."""
+        feature_values = df[self.feature_name][self.row_indices]
+        if self.categories is None:
+            is_right = feature_values >= self.threshold
+        else:
+            is_right = np.isin(feature_values, np.fromiter(self.categories, dtype=np.float32))
+        if self.missing_right:
+            is_right |= np.isnan(feature_values)
+        return is_right
 
     def predict(self) -> float:
         """Predict the output for given features."""
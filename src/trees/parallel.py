@@ -0,0 +1,197 @@
+"""Sharing datasets with worker processes and building node histograms on a pool of workers."""
+
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from multiprocessing.shared_memory import SharedMemory
+from typing import Self
+
+import numpy as np
+from numpy.typing import NDArray
+
+from trees.splitting.histogram import Histograms, build_histograms
+
+# Workers start from a fresh process rather than a fork of the caller, which may already be
+# multithreaded, e.g. by JAX, and could deadlock in a forked child. They attach to the shared
+# arrays by name, so they don't rely on inheriting memory from the caller.
+PROCESS_CONTEXT = multiprocessing.get_context(
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+
+
+@dataclass
+class HistogramBuilder:
+    """Builds the label histograms of a subset of rows of a binned dataset."""
+
+    codes: NDArray[np.uint8 | np.uint16]
+    labels: NDArray[np.float32]
+    max_bins: int
+    weights: NDArray[np.float64] | None = None
+
+    def __call__(self, row_indices: NDArray[np.intp]) -> Histograms:
+        """Build the histograms of the given rows."""
+        return build_histograms(
+            self.codes[row_indices],
+            self.labels[row_indices],
+            self.max_bins,
+            None if self.weights is None else self.weights[row_indices],
+        )
+
+
+@dataclass
+class SharedArraySpec:
+    """Everything a worker process needs to attach to an array in shared memory."""
+
+    name: str
+    shape: tuple[int, ...]
+    dtype: np.dtype
+
+
+class SharedArrays:
+    """Owner of arrays copied into shared memory, freed when the context exits."""
+
+    def __init__(self) -> None:
+        self._memory: list[SharedMemory] = []
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Free all the shared memory."""
+        for memory in self._memory:
+            memory.close()
+            memory.unlink()
+        self._memory = []
+
+    def share(self, array: NDArray) -> SharedArraySpec:
+        """Copy an array into shared memory."""
+        memory = SharedMemory(create=True, size=max(array.nbytes, 1))
+        self._memory.append(memory)
+        spec = SharedArraySpec(name=memory.name, shape=array.shape, dtype=array.dtype)
+        self.write(spec, array)
+        return spec
+
+    def write(self, spec: SharedArraySpec, array: NDArray) -> None:
+        """Overwrite a shared array with new values of the same shape."""
+        memory = next(memory for memory in self._memory if memory.name == spec.name)
+        np.ndarray(spec.shape, dtype=spec.dtype, buffer=memory.buf)[...] = array
+
+
+# Shared memory attached to by this process, kept open for the lifetime of the worker
+_worker_memory: list[SharedMemory] = []
+# Set in each worker process by `_attach_worker`
+_worker_builder: HistogramBuilder | None = None
+
+
+def attach_shared_array(spec: SharedArraySpec) -> NDArray:
+    """Get an array in shared memory from a worker process, without copying it."""
+    memory = SharedMemory(name=spec.name)
+    _worker_memory.append(memory)
+    return np.ndarray(spec.shape, dtype=spec.dtype, buffer=memory.buf)
+
+
+class HistogramPool:
+    """Pool of workers that build node histograms in parallel.
+
+    With processes, the bin codes, labels and weights are copied into shared memory once when the
+    pool starts, so tasks only send the row indices of a node. With a single worker, histograms are
+    built in the calling process. A pool can be reused for several trees on the same bin codes,
+    with `update` to change the labels and weights between them.
+    """
+
+    def __init__(
+        self,
+        codes: NDArray[np.uint8 | np.uint16],
+        labels: NDArray[np.float32],
+        max_bins: int,
+        n_workers: int = 1,
+        use_processes: bool = True,
+        weights: NDArray[np.float64] | None = None,
+    ) -> None:
+        if n_workers < 1:
+            msg = f"n_workers must be at least 1, got {n_workers}."
+            raise ValueError(msg)
+        self.builder = HistogramBuilder(
+            codes=codes, labels=labels, max_bins=max_bins, weights=weights
+        )
+        self.n_workers = n_workers
+        self.use_processes = use_processes
+        self._executor: Executor | None = None
+        self._shared_arrays = SharedArrays()
+        self._specs: list[SharedArraySpec] = []
+
+    def __enter__(self) -> Self:
+        if self.n_workers == 1:
+            return self
+        if not self.use_processes:
+            self._executor = ThreadPoolExecutor(max_workers=self.n_workers)
+            return self
+
+        self._specs = [
+            self._shared_arrays.share(self.builder.codes),
+            self._shared_arrays.share(self.builder.labels),
+        ]
+        if self.builder.weights is not None:
+            self._specs.append(self._shared_arrays.share(self.builder.weights))
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.n_workers,
+            mp_context=PROCESS_CONTEXT,
+            initializer=_attach_worker,
+            initargs=(self._specs, self.builder.max_bins),
+        )
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        self._specs = []
+        self._shared_arrays.close()
+
+    def update(
+        self, labels: NDArray[np.float32 | np.float64], weights: NDArray[np.float64] | None = None
+    ) -> None:
+        """Replace the labels and weights the histograms are built from, e.g. for a new tree.
+
+        They must have the shapes and dtypes the pool was created with, since running workers read
+        them from shared memory, which is overwritten in place.
+        """
+        layouts = [(array.shape, array.dtype) for array in (labels, weights) if array is not None]
+        expected = [
+            (array.shape, array.dtype)
+            for array in (self.builder.labels, self.builder.weights)
+            if array is not None
+        ]
+        if (weights is None) != (self.builder.weights is None) or layouts != expected:
+            msg = f"Labels and weights must have shapes and dtypes {expected}, got {layouts}."
+            raise ValueError(msg)
+        self.builder = replace(self.builder, labels=labels, weights=weights)
+        for spec, array in zip(self._specs[1:], (labels, weights), strict=False):
+            self._shared_arrays.write(spec, array)
+
+    def map(self, row_indices: list[NDArray[np.intp]]) -> list[Histograms]:
+        """Build the histograms for each array of row indices."""
+        if self._executor is None:
+            return [self.builder(rows) for rows in row_indices]
+        task = _build_in_worker if self.use_processes else self.builder
+        return list(self._executor.map(task, row_indices))
+
+
+def _attach_worker(specs: list[SharedArraySpec], max_bins: int) -> None:
+    """Attach a worker process to the shared bin codes, labels and weights."""
+    global _worker_builder
+    codes, labels, *weights = [attach_shared_array(spec) for spec in specs]
+    _worker_builder = HistogramBuilder(
+        codes=codes, labels=labels, max_bins=max_bins, weights=weights[0] if weights else None
+    )
+
+
+def _build_in_worker(row_indices: NDArray[np.intp]) -> Histograms:
+    """Build histograms in a worker process."""
+    if _worker_builder is None:
+        msg = "Worker process is not attached to the shared dataset."
+        raise RuntimeError(msg)
+    return _worker_builder(row_indices)
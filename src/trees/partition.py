@@ -0,0 +1,32 @@
+"""Row storage shared by all the nodes of a tree."""
+
+import numpy as np
+from numpy.typing import NDArray
+
+
+class RowPartition:
+    """Permutation of the rows of a tree in which every node owns a contiguous range.
+
+    Splitting a node reorders its range in place so that the rows of its left child come first,
+    so the whole tree stores each row once however deep it grows. The given row indices are
+    reordered in place too, unless they need converting to `np.intp`.
+    """
+
+    def __init__(self, row_indices: NDArray[np.intp]) -> None:
+        self.row_indices: NDArray[np.intp] = np.asarray(row_indices, dtype=np.intp)
+
+    def __len__(self) -> int:
+        return len(self.row_indices)
+
+    def get_rows(self, start: int, end: int) -> NDArray[np.intp]:
+        """Get a view of the rows in a range."""
+        return self.row_indices[start:end]
+
+    def partition(self, start: int, end: int, is_right: NDArray[np.bool_]) -> int:
+        """Move the rows of a range that go right after the others, keeping their order.
+
+        Returns the position of the first row that goes right.
+        """
+        rows = self.row_indices[start:end]
+        rows[:] = np.concatenate([rows[~is_right], rows[is_right]])
+        return end - int(np.count_nonzero(is_right))
@@ -0,0 +1,158 @@
+"""Opt-in timing and memory instrumentation of the phases of building and editing trees.
+
+Phases are wrapped in `with phase(name, size):`, where `size` is the number of rows or nodes the
+phase works on. While profiling is disabled, `phase` returns a shared no-op context manager, so
+instrumented code only pays for one function call.
+"""
+
+import json
+import time
+import tracemalloc
+from collections.abc import Iterator
+from contextlib import AbstractContextManager, contextmanager, nullcontext
+from dataclasses import dataclass
+from pathlib import Path
+
+_NULL_CONTEXT = nullcontext()
+
+
+@dataclass
+class PhaseStats:
+    """Call count, wall time and peak extra memory of one phase at one size."""
+
+    calls: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+    peak_bytes: int = 0
+
+    def record(self, seconds: float, peak_bytes: int) -> None:
+        """Add one call of the phase."""
+        self.calls += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.peak_bytes = max(self.peak_bytes, peak_bytes)
+
+
+class _Profiler:
+    """Global state of the profiler."""
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.started_tracing = False
+        # Stats by phase name and size bucket
+        self.stats: dict[tuple[str, int], PhaseStats] = {}
+        # Highest traced memory seen so far in each phase that is running, innermost last
+        self.peaks: list[int] = []
+
+    @contextmanager
+    def measure(self, name: str, size: int) -> Iterator[None]:
+        """Time a phase and measure the most memory it had allocated at once."""
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            current, peak = tracemalloc.get_traced_memory()
+            if self.peaks:
+                self.peaks[-1] = max(self.peaks[-1], peak)
+            tracemalloc.reset_peak()
+            self.peaks.append(current)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            peak_bytes = 0
+            if tracing:
+                phase_peak = max(self.peaks.pop(), tracemalloc.get_traced_memory()[1])
+                peak_bytes = max(phase_peak - current, 0)
+                if self.peaks:
+                    self.peaks[-1] = max(self.peaks[-1], phase_peak)
+            self.stats.setdefault((name, _get_size_bucket(size)), PhaseStats()).record(
+                seconds, peak_bytes
+            )
+
+
+_profiler = _Profiler()
+
+
+def phase(name: str, size: int = 0) -> AbstractContextManager[None]:
+    """Profile a phase of work on `size` rows or nodes, if profiling is enabled."""
+    if not _profiler.enabled:
+        return _NULL_CONTEXT
+    return _profiler.measure(name, size)
+
+
+def enable(trace_memory: bool = True) -> None:
+    """Start profiling, also tracing memory allocations unless `trace_memory` is False."""
+    _profiler.enabled = True
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _profiler.started_tracing = True
+
+
+def disable() -> None:
+    """Stop profiling, keeping the stats collected so far."""
+    _profiler.enabled = False
+    if _profiler.started_tracing:
+        tracemalloc.stop()
+        _profiler.started_tracing = False
+
+
+def is_enabled() -> bool:
+    """Check if profiling is enabled."""
+    return _profiler.enabled
+
+
+def reset() -> None:
+    """Drop the stats collected so far."""
+    _profiler.stats.clear()
+
+
+@contextmanager
+def profiling(trace_memory: bool = True) -> Iterator[None]:
+    """Profile everything run inside the context."""
+    enable(trace_memory)
+    try:
+        yield
+    finally:
+        disable()
+
+
+def get_summary() -> list[dict[str, str | int | float]]:
+    """Get the stats of every phase and size bucket, the most time-consuming first."""
+    return [
+        {
+            "phase": name,
+            "size": size,
+            "calls": stats.calls,
+            "total_seconds": stats.total_seconds,
+            "mean_seconds": stats.total_seconds / stats.calls,
+            "max_seconds": stats.max_seconds,
+            "peak_bytes": stats.peak_bytes,
+        }
+        for (name, size), stats in sorted(
+            _profiler.stats.items(), key=lambda item: -item[1].total_seconds
+        )
+    ]
+
+
+def format_summary() -> str:
+    """Get the summary as a plain-text table."""
+    lines = [
+        f"{'phase':<36} {'size':>10} {'calls':>7} {'total ms':>10} {'mean ms':>9} {'peak KiB':>9}"
+    ]
+    for row in get_summary():
+        lines.append(
+            f"{row['phase']:<36} {row['size']:>10} {row['calls']:>7} "
+            f"{row['total_seconds'] * 1e3:>10.3f} {row['mean_seconds'] * 1e3:>9.3f} "
+            f"{row['peak_bytes'] / 1024:>9.1f}"
+        )
+    return "\n".join(lines)
+
+
+def dump(path: Path) -> None:
+    """Save the summary as JSON."""
+    path.write_text(json.dumps(get_summary(), indent=2))
+
+
+def _get_size_bucket(size: int) -> int:
+    """Round a size down to a power of two, so that stats are grouped by order of magnitude."""
+    return 0 if size <= 0 else 1 << (size.bit_length() - 1)
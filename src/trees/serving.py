@@ -0,0 +1,310 @@
+"""HTTP scoring server that groups concurrent requests into micro-batches."""
+
+import asyncio
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from http import HTTPStatus
+from pathlib import Path
+from typing import Protocol
+
+import numpy as np
+from numpy.typing import NDArray
+
+from trees.compiled import CompiledTree, read_metadata
+from trees.ensemble import CompiledEnsemble
+
+DEFAULT_MAX_BATCH_SIZE = 1024
+DEFAULT_MAX_WAIT = 0.002
+_MAX_HEADER_LINES = 100
+# Errors from predicting on malformed features, which are the client's fault
+_SCORING_ERRORS = (ValueError, IndexError, TypeError)
+
+_logger = logging.getLogger(__name__)
+
+
+class Model(Protocol):
+    """Anything that predicts log odds for a feature matrix with the given feature columns."""
+
+    feature_names: list[str]
+
+    def predict(self, features: NDArray[np.float32]) -> NDArray[np.float64]: ...
+
+
+def load_model(path: Path) -> Model:
+    """Load a saved tree or ensemble in compiled form, memory-mapped."""
+    if "n_trees" in read_metadata(path):
+        return CompiledEnsemble.load(path)
+    return CompiledTree.load(path)
+
+
+@dataclass
+class ServingStats:
+    """Counters of the requests, rows and batches scored so far."""
+
+    n_requests: int = 0
+    n_rows: int = 0
+    n_batches: int = 0
+    total_batch_seconds: float = 0.0
+    max_batch_seconds: float = 0.0
+    last_batch_seconds: float = 0.0
+    last_batch_size: int = 0
+    started_at: float = field(default_factory=time.perf_counter)
+
+    def record_batch(self, n_requests: int, n_rows: int, seconds: float) -> None:
+        """Add a scored batch to the counters."""
+        self.n_requests += n_requests
+        self.n_rows += n_rows
+        self.n_batches += 1
+        self.total_batch_seconds += seconds
+        self.max_batch_seconds = max(self.max_batch_seconds, seconds)
+        self.last_batch_seconds = seconds
+        self.last_batch_size = n_rows
+
+    def as_dict(self) -> dict[str, float]:
+        """Get the counters, with mean batch size and latency and rows per second."""
+        uptime = time.perf_counter() - self.started_at
+        return {
+            "n_requests": self.n_requests,
+            "n_rows": self.n_rows,
+            "n_batches": self.n_batches,
+            "mean_batch_size": self.n_rows / self.n_batches if self.n_batches else 0.0,
+            "mean_batch_seconds": (
+                self.total_batch_seconds / self.n_batches if self.n_batches else 0.0
+            ),
+            "max_batch_seconds": self.max_batch_seconds,
+            "last_batch_seconds": self.last_batch_seconds,
+            "last_batch_size": self.last_batch_size,
+            "rows_per_second": self.n_rows / uptime if uptime > 0 else 0.0,
+            "uptime_seconds": uptime,
+        }
+
+
+@dataclass
+class _Request:
+    """Rows waiting to be scored and the future their predictions are delivered to."""
+
+    features: NDArray[np.float32]
+    result: asyncio.Future[NDArray[np.float64]]
+
+
+class MicroBatcher:
+    """Collects the rows of concurrent requests and scores them with one predict per batch.
+
+    A batch is scored once it holds `max_batch_size` rows or `max_wait` seconds after its first
+    request arrived, whichever comes first. A single request larger than `max_batch_size` is scored
+    as a batch of its own, and only requests with the same number of columns are batched together.
+    Predictions run in a worker thread so requests keep being collected.
+    """
+
+    def __init__(
+        self,
+        model: Model,
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        max_wait: float = DEFAULT_MAX_WAIT,
+    ) -> None:
+        if max_batch_size < 1:
+            msg = f"max_batch_size must be at least 1, got {max_batch_size}."
+            raise ValueError(msg)
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.stats = ServingStats()
+        self._queue: asyncio.Queue[_Request] = asyncio.Queue()
+        self._pending: _Request | None = None
+
+    async def predict(self, features: NDArray[np.float32]) -> NDArray[np.float64]:
+        """Queue rows for scoring and wait for their predictions."""
+        request = _Request(
+            features=np.atleast_2d(np.asarray(features, dtype=np.float32)),
+            result=asyncio.get_running_loop().create_future(),
+        )
+        await self._queue.put(request)
+        return await request.result
+
+    async def run(self) -> None:
+        """Score batches until cancelled."""
+        while True:
+            batch = await self._collect_batch()
+            start = time.perf_counter()
+            try:
+                logodds = await asyncio.to_thread(
+                    self.model.predict, np.concatenate([request.features for request in batch])
+                )
+            except _SCORING_ERRORS as e:
+                _fail(batch, e)
+                continue
+            except Exception as e:
+                # Keep scoring later batches, the waiting requests get the error
+                _logger.exception("Failed to score a batch of %d requests.", len(batch))
+                _fail(batch, e)
+                continue
+            n_rows = len(logodds)
+            self.stats.record_batch(len(batch), n_rows, time.perf_counter() - start)
+            offsets = np.cumsum([len(request.features) for request in batch])[:-1]
+            for request, request_logodds in zip(batch, np.split(logodds, offsets), strict=True):
+                if not request.result.done():
+                    request.result.set_result(request_logodds)
+
+    async def _collect_batch(self) -> list[_Request]:
+        """Wait for a first request, then add more until the batch is full or the wait is over."""
+        first = self._pending if self._pending is not None else await self._queue.get()
+        self._pending = None
+        batch = [first]
+        n_rows = len(first.features)
+        deadline = asyncio.get_running_loop().time() + self.max_wait
+        while n_rows < self.max_batch_size:
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                request = await asyncio.wait_for(self._queue.get(), timeout)
+            except TimeoutError:
+                break
+            if (
+                n_rows + len(request.features) > self.max_batch_size
+                or request.features.shape[1] != first.features.shape[1]
+            ):
+                # Keep it for the next batch rather than going over the size limit or failing the
+                # whole batch on a malformed request
+                self._pending = request
+                break
+            batch.append(request)
+            n_rows += len(request.features)
+        return batch
+
+
+class ScoringServer:
+    """Minimal HTTP/1.1 server for a model, scoring requests in micro-batches.
+
+    `POST /predict` takes `{"features": [[...], ...]}` (or a single row) with one column per
+    feature of the model and returns `{"logodds": [...]}`. `GET /stats` returns the counters of
+    the batcher.
+    """
+
+    def __init__(
+        self,
+        model: Model,
+        host: str = "127.0.0.1",
+        port: int = 8000,
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        max_wait: float = DEFAULT_MAX_WAIT,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.batcher = MicroBatcher(model, max_batch_size, max_wait)
+        self._server: asyncio.Server | None = None
+        self._batcher_task: asyncio.Task[None] | None = None
+
+    async def start(self) -> None:
+        """Start listening and scoring; with port 0 the chosen port is stored in `port`."""
+        self._batcher_task = asyncio.create_task(self.batcher.run())
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        """Stop listening and scoring."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if self._batcher_task is not None:
+            self._batcher_task.cancel()
+            await asyncio.gather(self._batcher_task, return_exceptions=True)
+            self._batcher_task = None
+
+    async def serve_forever(self) -> None:
+        """Start the server and run until cancelled."""
+        await self.start()
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await self.stop()
+
+    async def _handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Answer the requests of one connection until the client closes it."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, version = request_line.decode("latin-1").split(maxsplit=2)
+                headers = await _read_headers(reader)
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                status, payload = await self._respond(method, target, body)
+                keep_alive = headers.get(
+                    "connection", ""
+                ).lower() != "close" and version.startswith("HTTP/1.1")
+                _write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, method: str, target: str, body: bytes) -> tuple[HTTPStatus, dict]:
+        """Route a request and get the status and JSON payload of the response."""
+        if target == "/stats" and method == "GET":
+            return HTTPStatus.OK, self.batcher.stats.as_dict()
+        if target != "/predict":
+            return HTTPStatus.NOT_FOUND, {"error": f"Unknown path {target}."}
+        if method != "POST":
+            return HTTPStatus.METHOD_NOT_ALLOWED, {"error": "Use POST to predict."}
+        try:
+            features = np.asarray(json.loads(body)["features"], dtype=np.float32)
+        except (ValueError, KeyError, TypeError) as e:
+            return HTTPStatus.BAD_REQUEST, {"error": f"Invalid request body: {e}"}
+        if features.ndim == 1:
+            features = features[np.newaxis, :]
+        n_features = len(self.batcher.model.feature_names)
+        if features.ndim != 2 or features.shape[1] != n_features:
+            return HTTPStatus.BAD_REQUEST, {
+                "error": f"Expected rows of {n_features} features, got shape {features.shape}."
+            }
+        try:
+            logodds = await self.batcher.predict(features)
+        except _SCORING_ERRORS as e:
+            return HTTPStatus.BAD_REQUEST, {"error": f"Can't score the features: {e}"}
+        except Exception as e:
+            _logger.exception("Failed to answer a prediction request.")
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {"error": f"Internal error: {e}"}
+        return HTTPStatus.OK, {"logodds": logodds.tolist()}
+
+
+def _fail(batch: list[_Request], error: Exception) -> None:
+    """Deliver an error to the requests of a batch that are still waiting."""
+    for request in batch:
+        if not request.result.done():
+            request.result.set_exception(error)
+
+
+async def _read_headers(reader: asyncio.StreamReader) -> dict[str, str]:
+    """Read the headers of a request, with lower-case names."""
+    headers = {}
+    for _ in range(_MAX_HEADER_LINES):
+        line = (await reader.readline()).decode("latin-1").strip()
+        if not line:
+            return headers
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    msg = "Too many header lines."
+    raise ValueError(msg)
+
+
+def _write_response(
+    writer: asyncio.StreamWriter, status: HTTPStatus, payload: dict, keep_alive: bool
+) -> None:
+    """Write a JSON response."""
+    body = json.dumps(payload).encode()
+    head = (
+        f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+        "Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    writer.write(head.encode("latin-1") + body)
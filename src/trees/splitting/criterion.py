@@ -0,0 +1,89 @@
+"""Protocol for vectorized split criteria."""
+
+from collections.abc import Callable
+from typing import Protocol
+
+import numpy as np
+from numpy.typing import NDArray
+
+
+class SplitCriterion(Protocol):
+    """Scores every candidate split of a node at once from cumulative label counts.
+
+    `n_left` and `n_positive_left` hold the number of observations and the number of positive
+    labels that end up in the left child for each candidate threshold. The totals are the counts
+    for the whole node. Higher return values mean better splits.
+    """
+
+    def __call__(
+        self,
+        n_left: NDArray[np.float64],
+        n_positive_left: NDArray[np.float64],
+        n_total: float,
+        n_positive_total: float,
+    ) -> NDArray[np.float64]:
+        """Get the gain of each candidate split."""
+        ...
+
+
+def impurity_decrease(
+    impurity: Callable[[NDArray[np.float64], NDArray[np.float64]], NDArray[np.float64]],
+    n_left: NDArray[np.float64],
+    n_positive_left: NDArray[np.float64],
+    n_total: float,
+    n_positive_total: float,
+) -> NDArray[np.float64]:
+    """Get the decrease in size-weighted impurity for each candidate split."""
+    n_right = n_total - n_left
+    n_positive_right = n_positive_total - n_positive_left
+    parent_impurity = impurity(np.asarray(n_total), np.asarray(n_positive_total))
+    weighted_impurity = (
+        n_left * impurity(n_left, n_positive_left) + n_right * impurity(n_right, n_positive_right)
+    ) / n_total
+    return parent_impurity - weighted_impurity
+
+
+def positive_fraction(
+    n_obs: NDArray[np.float64], n_positive: NDArray[np.float64]
+) -> NDArray[np.float64]:
+    """Get the fraction of positive labels, treating empty groups as pure."""
+    n_obs, n_positive = np.broadcast_arrays(
+        np.asarray(n_obs, dtype=np.float64), np.asarray(n_positive, dtype=np.float64)
+    )
+    return np.divide(n_positive, n_obs, out=np.zeros(n_obs.shape), where=n_obs > 0)
+
+
+def score_missing_directions(
+    criterion: SplitCriterion,
+    n_left_present: NDArray[np.float64],
+    n_positive_left_present: NDArray[np.float64],
+    n_missing: NDArray[np.float64] | float,
+    n_positive_missing: NDArray[np.float64] | float,
+    n_total: NDArray[np.float64] | float,
+    n_positive_total: NDArray[np.float64] | float,
+    is_valid: NDArray[np.bool_],
+    min_samples_leaf: float = 1,
+) -> tuple[NDArray[np.float64], NDArray[np.bool_]]:
+    """Score candidate splits with the missing values sent left and sent right.
+
+    `n_left_present` and `n_positive_left_present` count the rows with a value that go left. Each
+    candidate keeps the better direction, preferring left on ties, so without missing values
+    nothing changes. Candidates that aren't valid or that leave fewer than `min_samples_leaf`
+    observations in a child get a gain of -inf. Returns the gains and whether missing values go
+    right.
+    """
+    gains = np.full(np.shape(is_valid), -np.inf)
+    missing_right = np.zeros(np.shape(is_valid), dtype=np.bool_)
+    directions = [(False, n_missing, n_positive_missing)]
+    if np.any(np.asarray(n_missing) > 0):
+        directions.append((True, 0.0, 0.0))
+    for is_right, n_left_missing, n_positive_left_missing in directions:
+        n_left = n_left_present + n_left_missing
+        direction_gains = criterion(
+            n_left, n_positive_left_present + n_positive_left_missing, n_total, n_positive_total
+        )
+        is_better = is_valid & (n_left >= min_samples_leaf) & (n_total - n_left >= min_samples_leaf)
+        is_better &= direction_gains > gains
+        gains = np.where(is_better, direction_gains, gains)
+        missing_right |= is_better & is_right
+    return gains, missing_right
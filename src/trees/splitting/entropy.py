@@ -1,35 +1,27 @@
 """Spltting based on information gain."""
 
-import math
-
 import numpy as np
 from numpy.typing import NDArray
 
+from trees.splitting.criterion import impurity_decrease, positive_fraction
+
+
+def entropy(n_obs: NDArray[np.float64], n_positive: NDArray[np.float64]) -> NDArray[np.float64]:
+    """Calculate the entropy of groups from their label counts."""
+    p = positive_fraction(n_obs, n_positive)
+    return -(_xlogx(p) + _xlogx(1 - p))
+
+
+def information_gain(
+    n_left: NDArray[np.float64],
+    n_positive_left: NDArray[np.float64],
+    n_total: float,
+    n_positive_total: float,
+) -> NDArray[np.float64]:
+    """Calculate the information gain for every candidate split at once."""
+    return impurity_decrease(entropy, n_left, n_positive_left, n_total, n_positive_total)
+
 
-def calculate_entropy(
-    feature_values: NDArray[np.float32], labels: NDArray[np.float32], threshold: float
-) -> float:
-    """Calculate the entropy if the feature is split to two categories at threshold."""
-    mask = feature_values > threshold
-    p: float = labels[mask].mean()
-    if p in {0, 1}:
-        return 0.0
-    return -(p * math.log(p) + (1 - p) * math.log(1 - p))
-
-
-def calculate_information_gain(
-    feature_values: NDArray[np.float32], labels: NDArray[np.float32], threshold: float
-) -> float:
-    """Calculate the information gain when splitting node at threshold."""
-    parent_entropy = calculate_entropy(feature_values, labels, threshold)
-    mask: NDArray[np.bool] = feature_values <= threshold
-    left_entropy = calculate_entropy(feature_values[mask], labels[mask], threshold)
-    right_entropy = calculate_entropy(feature_values[~mask], labels[~mask], threshold)
-    total_size = len(feature_values)
-    left_size = len(feature_values[mask])
-    right_size = total_size - left_size
-
-    weighted_entropy = (left_size / total_size) * left_entropy + (
-        right_size / total_size
-    ) * right_entropy
-    return parent_entropy - weighted_entropy
+def _xlogx(x: NDArray[np.float64]) -> NDArray[np.float64]:
+    """Calculate x * log(x), with the limit 0 at x = 0."""
+    return x * np.log(np.where(x > 0, x, 1.0))
@@ -3,25 +3,22 @@
 import numpy as np
 from numpy.typing import NDArray
 
+from trees.splitting.criterion import impurity_decrease, positive_fraction
 
-# @jit
-def calculate_gini_impurity(
-    feature_values: NDArray[np.float32], labels: NDArray[np.float32], threshold: float
-) -> float:
-    """Calculate the Gini coefficient if the feature is split to two categories at threshold."""
-    mask = feature_values > threshold
-    if mask.sum() == 0 or mask.sum() == len(mask):
-        return 1
-    p = (labels * mask).sum() / mask.sum()
-    return p * (1 - p)
 
+def gini_impurity(
+    n_obs: NDArray[np.float64], n_positive: NDArray[np.float64]
+) -> NDArray[np.float64]:
+    """Calculate the Gini impurity of groups from their label counts."""
+    p = positive_fraction(n_obs, n_positive)
+    return 2 * p * (1 - p)
 
-def calculate_increase_in_gini_impurity(
-    feature_values: NDArray[np.float32], labels: NDArray[np.float32], threshold: float
-) -> float:
-    """Calculate the increase in overall Gini impurity when splitting node at threshold."""
-    parent_gini_impurity = calculate_gini_impurity(feature_values, labels, threshold)
-    mask = feature_values <= threshold
-    left_gini_impurity = calculate_gini_impurity(feature_values[mask], labels[mask], threshold)
-    right_gini_impurity = calculate_gini_impurity(feature_values[~mask], labels[~mask], threshold)
-    return (left_gini_impurity + right_gini_impurity) - parent_gini_impurity
+
+def gini_gain(
+    n_left: NDArray[np.float64],
+    n_positive_left: NDArray[np.float64],
+    n_total: float,
+    n_positive_total: float,
+) -> NDArray[np.float64]:
+    """Calculate the decrease in Gini impurity for every candidate split at once."""
+    return impurity_decrease(gini_impurity, n_left, n_positive_left, n_total, n_positive_total)
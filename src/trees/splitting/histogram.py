@@ -0,0 +1,141 @@
+"""Histogram-based split finding on binned features."""
+
+from dataclasses import dataclass
+
+import numpy as np
+from numpy.typing import NDArray
+
+from trees.splitting.criterion import SplitCriterion, score_missing_directions
+
+
+@dataclass
+class Histograms:
+    """Per-bin label counts for each feature of a node. The last bin holds the missing values."""
+
+    counts: NDArray[np.float64]
+    positives: NDArray[np.float64]
+
+    @property
+    def n_total(self) -> float:
+        """Get the number of observations in the node."""
+        return float(self.counts[0].sum())
+
+    @property
+    def n_positive_total(self) -> float:
+        """Get the number of positive labels in the node."""
+        return float(self.positives[0].sum())
+
+    def __sub__(self, other: "Histograms") -> "Histograms":
+        """Get the histograms of the rows in this node that are not in the other node."""
+        return Histograms(
+            counts=self.counts - other.counts, positives=self.positives - other.positives
+        )
+
+
+def build_histograms(
+    codes: NDArray[np.uint8 | np.uint16],
+    labels: NDArray[np.float32],
+    max_bins: int,
+    weights: NDArray[np.float64] | None = None,
+) -> Histograms:
+    """Count observations and positive labels per bin for every column of the bin codes.
+
+    With `weights`, each row counts with its weight and the labels can be any real targets, so the
+    histograms hold sums of the weights and of the weighted targets.
+    """
+    n_features = codes.shape[1]
+    counts = np.empty((n_features, max_bins + 1))
+    positives = np.empty((n_features, max_bins + 1))
+    weighted_labels = labels if weights is None else weights * labels
+    for j in range(n_features):
+        counts[j] = np.bincount(codes[:, j], weights=weights, minlength=max_bins + 1)
+        positives[j] = np.bincount(codes[:, j], weights=weighted_labels, minlength=max_bins + 1)
+    return Histograms(counts=counts, positives=positives)
+
+
+def score_histograms(
+    histograms: Histograms,
+    bin_edges: NDArray[np.float32],
+    criterion: SplitCriterion,
+    min_samples_leaf: float = 1,
+) -> tuple[NDArray[np.float32], NDArray[np.float64], NDArray[np.bool_]]:
+    """Find the best bin edge of every feature from its histogram.
+
+    Every edge is scored with the missing values sent to either child, see
+    `score_missing_directions`. Splits leaving fewer than `min_samples_leaf` observations in either
+    child are not considered. Returns the best threshold, its gain and whether it sends missing
+    values right for each feature; features without a valid split get a NaN threshold and a gain
+    of -inf.
+    """
+    n_left_present = np.cumsum(histograms.counts[:, :-1], axis=1)[:, :-1]
+    n_positive_left_present = np.cumsum(histograms.positives[:, :-1], axis=1)[:, :-1]
+    n_present = histograms.counts[:, :-1].sum(axis=1, keepdims=True)
+    is_valid = ~np.isnan(bin_edges) & (n_left_present > 0) & (n_left_present < n_present)
+    candidate_gains, candidate_missing_right = score_missing_directions(
+        criterion,
+        n_left_present,
+        n_positive_left_present,
+        histograms.counts[:, -1:],
+        histograms.positives[:, -1:],
+        histograms.n_total,
+        histograms.n_positive_total,
+        is_valid,
+        min_samples_leaf,
+    )
+
+    best_bins = np.argmax(candidate_gains, axis=1)
+    features = np.arange(len(best_bins))
+    gains = candidate_gains[features, best_bins]
+    has_split = np.isfinite(gains)
+    thresholds = np.where(has_split, bin_edges[features, best_bins], np.nan).astype(np.float32)
+    return thresholds, gains, candidate_missing_right[features, best_bins]
+
+
+def score_category_histogram(
+    counts: NDArray[np.float64],
+    positives: NDArray[np.float64],
+    criterion: SplitCriterion,
+    min_samples_leaf: float = 1,
+) -> tuple[NDArray[np.intp], NDArray[np.float64], NDArray[np.bool_]]:
+    """Score the splits of a categorical feature from its per-category counts.
+
+    The last entry of the counts holds the missing values, which are sent to either child, see
+    `score_missing_directions`. The present categories are ordered by their mean label, and for a
+    criterion that only depends on the counts on each side the best subset to send right is one of
+    the tails of that order, so only `k - 1` subsets have to be scored. Returns the ordered
+    categories and, for each position, the gain of sending the categories after it to the right
+    child and whether that split sends missing values right.
+    """
+    present = np.flatnonzero(counts[:-1] > 0)
+    order = present[np.argsort(positives[present] / counts[present], kind="stable")]
+    n_left_present = np.cumsum(counts[order])[:-1]
+    gains, missing_right = score_missing_directions(
+        criterion,
+        n_left_present,
+        np.cumsum(positives[order])[:-1],
+        counts[-1],
+        positives[-1],
+        float(counts.sum()),
+        float(positives.sum()),
+        np.ones(len(n_left_present), dtype=np.bool_),
+        min_samples_leaf,
+    )
+    return order, gains, missing_right
+
+
+def get_best_categories(
+    order: NDArray[np.intp], gains: NDArray[np.float64], missing_right: NDArray[np.bool_]
+) -> tuple[float, frozenset[int], bool]:
+    """Get the best split of the ordered categories from `score_category_histogram`.
+
+    Returns its gain, the categories it sends right and whether it sends missing values right, or
+    a gain of -inf and no categories if no split is valid.
+    """
+    if len(gains) == 0 or not np.isfinite(gains.max()):
+        return -np.inf, frozenset(), False
+    best = int(np.argmax(gains))
+    return (
+        float(gains[best]),
+        frozenset(int(category) for category in order[best + 1 :]),
+        bool(missing_right[best]),
+    )
@@ -1,31 +1,252 @@
 """Code for splitting nodes based on the data available to them."""
 
-from collections.abc import Callable
+from dataclasses import dataclass, field
 
 import numpy as np
 from numpy.typing import NDArray
 
 from trees.df import DataFrame
-from trees.splitting.gini import calculate_increase_in_gini_impurity
+from trees.profiling import phase
+from trees.splitting.criterion import SplitCriterion, score_missing_directions
+from trees.splitting.gini import gini_gain
+from trees.splitting.histogram import (
+    build_histograms,
+    get_best_categories,
+    score_category_histogram,
+    score_histograms,
+)
 
 
-def find_threshold_candidates(feature_values: NDArray[np.float32]) -> NDArray[np.float32]:
-    """Get candidates for the threshold based on the provided feature values."""
-    sorted_unique_values = np.sort(np.unique(feature_values))
-    return (sorted_unique_values[1:] + sorted_unique_values[:-1]) / 2.0
+def score_thresholds(
+    feature_values: NDArray[np.float32],
+    labels: NDArray[np.float32],
+    criterion: SplitCriterion = gini_gain,
+) -> tuple[NDArray[np.float32], NDArray[np.float64], NDArray[np.bool_]]:
+    """Score every candidate threshold of a feature in a single pass over the sorted values.
+
+    Rows with missing feature values are sent to whichever child gives the higher gain, see
+    `score_missing_directions`. Returns the candidate thresholds, the gain of splitting at each of
+    them and whether that split sends missing values right.
+    """
+    is_null = np.isnan(feature_values)
+    n_null = float(is_null.sum())
+    n_positive_null = float(labels[is_null].sum(dtype=np.float64))
+
+    present_values = feature_values[~is_null]
+    order = np.argsort(present_values, kind="stable")
+    sorted_values = present_values[order]
+    cumulative_positives = np.cumsum(labels[~is_null][order], dtype=np.float64)
+
+    # The last row before each change in value is where a threshold can go
+    boundaries = np.flatnonzero(sorted_values[1:] != sorted_values[:-1])
+    thresholds = (sorted_values[boundaries] + sorted_values[boundaries + 1]) / 2.0
+
+    n_positive_total = n_positive_null + (
+        float(cumulative_positives[-1]) if len(cumulative_positives) else 0.0
+    )
+    gains, missing_right = score_missing_directions(
+        criterion,
+        boundaries + 1.0,
+        cumulative_positives[boundaries],
+        n_null,
+        n_positive_null,
+        float(len(feature_values)),
+        n_positive_total,
+        np.ones(len(boundaries), dtype=np.bool_),
+    )
+    return thresholds, gains, missing_right
+
+
+def score_categories(
+    feature_values: NDArray[np.float32],
+    labels: NDArray[np.float32],
+    criterion: SplitCriterion = gini_gain,
+) -> tuple[NDArray[np.intp], NDArray[np.float64], NDArray[np.bool_]]:
+    """Score the splits of a categorical feature into two subsets of its categories.
+
+    Returns the category codes ordered by their mean label, the gain of sending the categories
+    after each position to the right child and whether that split sends missing values right, see
+    `score_category_histogram`.
+    """
+    is_null = np.isnan(feature_values)
+    codes = feature_values[~is_null].astype(np.intp)
+    n_categories = int(codes.max()) + 1 if len(codes) else 0
+    labels = labels.astype(np.float64)
+    counts = np.append(np.bincount(codes, minlength=n_categories), is_null.sum()).astype(np.float64)
+    positives = np.append(
+        np.bincount(codes, weights=labels[~is_null], minlength=n_categories), labels[is_null].sum()
+    )
+    return score_category_histogram(counts, positives, criterion)
+
+
+def suggest_category_split(
+    df: DataFrame,
+    feature: str,
+    criterion: SplitCriterion = gini_gain,
+) -> tuple[float, frozenset[int], bool]:
+    """Suggest which categories of a categorical feature to send to the right child.
+
+    Returns the gain of the split, the codes of the categories and whether missing values go right.
+    """
+    with phase("suggest_category_split", len(df)):
+        gain, categories, missing_right = get_best_categories(
+            *score_categories(df[feature], df.labels, criterion)
+        )
+        if not categories:
+            msg = f"Feature {feature} has fewer than two categories, can't split on it."
+            raise ValueError(msg)
+        return gain, categories, missing_right
 
 
 def suggest_split_threshold(
     df: DataFrame,
     feature: str,
-    metric_function: Callable[
-        [NDArray[np.float32], NDArray[np.float32], float], float
-    ] = calculate_increase_in_gini_impurity,
-) -> tuple[float, float]:
-    """Suggest the threshold for a split. Returns the suggested threshold and the metric."""
-    feature_values = df[feature]
-    thresholds = find_threshold_candidates(feature_values)
-    return min(
-        (metric_function(feature_values, df.labels, threshold), threshold)
-        for threshold in thresholds
-    )
+    criterion: SplitCriterion = gini_gain,
+) -> tuple[float, float, bool]:
+    """Suggest the threshold for a split.
+
+    Returns the gain of the split, the threshold and whether missing values go right. If the
+    dataframe has binned features, only the bin edges are considered as thresholds.
+    """
+    with phase("suggest_split_threshold", len(df)):
+        if df.is_categorical(feature):
+            msg = f"Feature {feature} is categorical, use suggest_category_split."
+            raise ValueError(msg)
+        if df.bins is not None:
+            j = df.feature_names.index(feature)
+            histograms = build_histograms(df.bins.codes[:, [j]], df.labels, df.bins.max_bins)
+            thresholds, gains, missing_right = score_histograms(
+                histograms, df.bins.bin_edges[[j]], criterion
+            )
+            if not np.isfinite(gains[0]):
+                msg = f"Feature {feature} has fewer than two non-empty bins, can't split on it."
+                raise ValueError(msg)
+            return float(gains[0]), float(thresholds[0]), bool(missing_right[0])
+
+        thresholds, gains, missing_right = score_thresholds(df[feature], df.labels, criterion)
+        if len(thresholds) == 0:
+            msg = f"Feature {feature} has fewer than two distinct values, can't split on it."
+            raise ValueError(msg)
+        best = int(np.argmax(gains))
+        return float(gains[best]), float(thresholds[best]), bool(missing_right[best])
+
+
+@dataclass
+class SplitSuggestions:
+    """Best split threshold and its gain for every feature of a dataset.
+
+    `missing_right` holds whether each best split sends missing values to the right child.
+    Categorical features have a NaN threshold, and the codes of the categories their best split
+    sends to the right child are in `categories`.
+    """
+
+    feature_names: list[str]
+    thresholds: NDArray[np.float32]
+    gains: NDArray[np.float64]
+    missing_right: NDArray[np.bool_]
+    categories: dict[str, frozenset[int]] = field(default_factory=dict)
+
+    def __getitem__(self, feature: str) -> tuple[float, float]:
+        """Get the gain and threshold of the best split on a feature."""
+        index = self.feature_names.index(feature)
+        return float(self.gains[index]), float(self.thresholds[index])
+
+    def get_missing_right(self, feature: str) -> bool:
+        """Check if the best split on a feature sends missing values to the right child."""
+        return bool(self.missing_right[self.feature_names.index(feature)])
+
+    @property
+    def leaderboard(self) -> list[tuple[str, float, float]]:
+        """Get (feature, gain, threshold) for every splittable feature, best first."""
+        order = np.argsort(-self.gains, kind="stable")
+        return [
+            (self.feature_names[i], float(self.gains[i]), float(self.thresholds[i]))
+            for i in order
+            if np.isfinite(self.gains[i])
+        ]
+
+    @property
+    def best(self) -> tuple[str, float, float]:
+        """Get (feature, gain, threshold) of the best split over all features."""
+        leaderboard = self.leaderboard
+        if not leaderboard:
+            msg = "No feature has two or more distinct values, can't split."
+            raise ValueError(msg)
+        return leaderboard[0]
+
+
+def suggest_splits(df: DataFrame, criterion: SplitCriterion = gini_gain) -> SplitSuggestions:
+    """Find the best threshold for every feature at once.
+
+    All columns of the feature matrix are sorted together and scored in one batched pass. If the
+    dataframe has binned features, the splits are found from per-bin histograms instead, without
+    sorting. Categorical features are split into subsets of their categories instead. Features
+    without a valid split get a NaN threshold and a gain of -inf.
+    """
+    with phase("suggest_splits", len(df)):
+        if df.bins is not None:
+            histograms = build_histograms(df.bins.codes, df.labels, df.bins.max_bins)
+            thresholds, gains, missing_right = score_histograms(
+                histograms, df.bins.bin_edges, criterion
+            )
+            suggestions = SplitSuggestions(df.feature_names, thresholds, gains, missing_right)
+            return _add_category_splits(df, suggestions, criterion)
+
+        n_rows, n_features = df.features.shape
+        thresholds = np.full(n_features, np.nan, dtype=np.float32)
+        gains = np.full(n_features, -np.inf)
+        missing_right = np.zeros(n_features, dtype=np.bool_)
+        if n_rows < 2:
+            return SplitSuggestions(df.feature_names, thresholds, gains, missing_right)
+
+        # NaNs are sorted to the end of each column
+        order = np.argsort(df.features, axis=0, kind="stable")
+        sorted_values = np.take_along_axis(df.features, order, axis=0)
+        sorted_labels = df.labels.astype(np.float64)[order]
+        is_null = np.isnan(sorted_values)
+        n_null = is_null.sum(axis=0)
+        n_positive_null = np.where(is_null, sorted_labels, 0.0).sum(axis=0)
+        cumulative_positives = np.cumsum(np.where(is_null, 0.0, sorted_labels), axis=0)
+
+        # Valid thresholds sit between two different, non-null values
+        is_boundary = sorted_values[1:] != sorted_values[:-1]
+        is_boundary &= ~is_null[1:]
+        candidate_gains, candidate_missing_right = score_missing_directions(
+            criterion,
+            np.arange(1.0, n_rows)[:, None],
+            cumulative_positives[:-1],
+            n_null,
+            n_positive_null,
+            float(n_rows),
+            float(df.labels.sum()),
+            is_boundary,
+        )
+
+        best_rows = np.argmax(candidate_gains, axis=0)
+        columns = np.arange(n_features)
+        has_split = is_boundary[best_rows, columns]
+        gains[has_split] = candidate_gains[best_rows, columns][has_split]
+        missing_right[has_split] = candidate_missing_right[best_rows, columns][has_split]
+        thresholds[has_split] = (
+            (sorted_values[best_rows, columns] + sorted_values[best_rows + 1, columns]) / 2.0
+        )[has_split]
+        return _add_category_splits(
+            df, SplitSuggestions(df.feature_names, thresholds, gains, missing_right), criterion
+        )
+
+
+def _add_category_splits(
+    df: DataFrame, suggestions: SplitSuggestions, criterion: SplitCriterion
+) -> SplitSuggestions:
+    """Replace the splits of the categorical features with the best subsets of their categories."""
+    for feature in df.categories:
+        j = df.feature_names.index(feature)
+        gain, categories, missing_right = get_best_categories(
+            *score_categories(df[feature], df.labels, criterion)
+        )
+        suggestions.gains[j] = gain
+        suggestions.thresholds[j] = np.nan
+        suggestions.missing_right[j] = missing_right
+        if categories:
+            suggestions.categories[feature] = categories
+    return suggestions
@@ -0,0 +1,135 @@
+"""Per-node feature statistics for choosing splits, with a bounded cache."""
+
+from collections import OrderedDict
+from collections.abc import Callable
+from dataclasses import dataclass
+
+import numpy as np
+from numpy.typing import NDArray
+
+from trees.splitting.criterion import SplitCriterion
+from trees.splitting.histogram import get_best_categories
+from trees.splitting.split import score_categories, score_thresholds
+
+# Gain curves of large nodes take megabytes, so the cache is bounded by the size of its arrays
+DEFAULT_CACHE_BYTES = 256 * 2**20
+
+# Node id, feature name and split criterion
+StatsKey = tuple[int, str, SplitCriterion]
+
+
+@dataclass(frozen=True)
+class FeatureStats:
+    """Gain curve, value range and label statistics of one feature in a node.
+
+    `missing_right` holds whether each candidate split sends missing values to the right child. For
+    a categorical feature the thresholds are NaN, and `category_order` holds the category codes
+    ordered by their mean label, the gains being those of sending the categories after each
+    position to the right child.
+    """
+
+    thresholds: NDArray[np.float32]
+    gains: NDArray[np.float64]
+    missing_right: NDArray[np.bool_]
+    min_value: float
+    max_value: float
+    n_obs: int
+    n_positive: float
+    category_order: NDArray[np.intp] | None = None
+
+    @classmethod
+    def from_values(
+        cls,
+        feature_values: NDArray[np.float32],
+        labels: NDArray[np.float32],
+        criterion: SplitCriterion,
+        is_categorical: bool = False,
+    ) -> "FeatureStats":
+        """Score every candidate split and summarize the values and labels of a feature."""
+        if is_categorical:
+            category_order, gains, missing_right = score_categories(
+                feature_values, labels, criterion
+            )
+            thresholds = np.full(len(gains), np.nan, dtype=np.float32)
+        else:
+            category_order = None
+            thresholds, gains, missing_right = score_thresholds(feature_values, labels, criterion)
+        present_values = feature_values[~np.isnan(feature_values)]
+        return cls(
+            thresholds=thresholds,
+            gains=gains,
+            missing_right=missing_right,
+            min_value=float(present_values.min()) if len(present_values) else float("nan"),
+            max_value=float(present_values.max()) if len(present_values) else float("nan"),
+            n_obs=len(labels),
+            n_positive=float(labels.sum(dtype=np.float64)),
+            category_order=category_order,
+        )
+
+    @property
+    def best_gain(self) -> float:
+        """Get the gain of the best split, or -inf if the feature can't be split."""
+        return float(self.gains.max()) if len(self.gains) else -np.inf
+
+    @property
+    def best_threshold(self) -> float:
+        """Get the threshold of the best split, or NaN if the feature can't be split."""
+        return float(self.thresholds[np.argmax(self.gains)]) if len(self.gains) else float("nan")
+
+    @property
+    def best_missing_right(self) -> bool:
+        """Check if the best split sends missing values to the right child."""
+        return bool(self.missing_right[np.argmax(self.gains)]) if len(self.gains) else False
+
+    @property
+    def best_categories(self) -> frozenset[int] | None:
+        """Get the categories the best split sends right, or None for a numerical feature."""
+        if self.category_order is None:
+            return None
+        return get_best_categories(self.category_order, self.gains, self.missing_right)[1]
+
+    @property
+    def nbytes(self) -> int:
+        """Get the number of bytes taken by the arrays of the statistics."""
+        arrays = (self.thresholds, self.gains, self.missing_right, self.category_order)
+        return sum(array.nbytes for array in arrays if array is not None)
+
+
+class StatsCache:
+    """Least-recently-used cache of feature statistics, keyed by node id, feature and criterion.
+
+    The cache holds at most `max_bytes` bytes of arrays, and statistics larger than that aren't
+    cached at all. Entries are never invalidated: a node id always refers to the same rows, since
+    splitting a node only reorders its rows and ids are never reused. Entries of deleted nodes stay
+    valid in case the nodes are restored, e.g. by `trees.history`, until they are evicted.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_CACHE_BYTES) -> None:
+        if max_bytes < 0:
+            msg = f"max_bytes must not be negative, got {max_bytes}."
+            raise ValueError(msg)
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._entries: OrderedDict[StatsKey, FeatureStats] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: StatsKey, compute: Callable[[], FeatureStats]) -> FeatureStats:
+        """Get the cached statistics for a key, computing and caching them on a miss."""
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return self._entries[key]
+        stats = compute()
+        if stats.nbytes > self.max_bytes:
+            return stats
+        self._entries[key] = stats
+        self.nbytes += stats.nbytes
+        while self.nbytes > self.max_bytes:
+            self.nbytes -= self._entries.popitem(last=False)[1].nbytes
+        return stats
+
+    def clear(self) -> None:
+        """Drop every entry."""
+        self._entries.clear()
+        self.nbytes = 0
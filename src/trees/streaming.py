@@ -0,0 +1,307 @@
+"""Growing trees on datasets larger than memory by streaming them in batches."""
+
+from collections.abc import Iterator
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Self
+
+import numpy as np
+import polars as pl
+from numpy.typing import NDArray
+
+from trees.binning import MAX_BINS_UINT8, assign_bins, find_bin_edges
+from trees.compiled import LEAF, CompiledTree
+from trees.splitting.criterion import SplitCriterion
+from trees.splitting.gini import gini_gain
+from trees.splitting.histogram import Histograms, score_histograms
+
+DEFAULT_BATCH_SIZE = 100_000
+DEFAULT_SAMPLE_SIZE = 100_000
+DEFAULT_MAX_HISTOGRAM_BYTES = 256 * 2**20
+
+
+def scan_file(path: Path) -> pl.LazyFrame:
+    """Lazily scan a CSV or Parquet file, depending on its suffix."""
+    if path.suffix == ".csv":
+        return pl.scan_csv(path)
+    if path.suffix == ".parquet":
+        return pl.scan_parquet(path)
+    msg = f"Can't scan {path}: expected a .csv or .parquet file."
+    raise ValueError(msg)
+
+
+def iter_batches(lf: pl.LazyFrame, batch_size: int) -> Iterator[pl.DataFrame]:
+    """Collect a lazy frame in batches of about `batch_size` rows.
+
+    Polars versions without `LazyFrame.collect_batches` fall back to collecting one slice of the
+    scan at a time, which has to skip over the preceding rows of CSV files for every batch.
+    """
+    if hasattr(lf, "collect_batches"):
+        yield from lf.collect_batches(chunk_size=batch_size)
+        return
+    offset = 0
+    while len(batch := lf.slice(offset, batch_size).collect()):
+        yield batch
+        offset += len(batch)
+
+
+@dataclass
+class StreamingSource:
+    """Dataset that is read in batches from a lazy frame every time it's iterated over.
+
+    Only one batch of `batch_size` rows is held in memory at a time.
+    """
+
+    lf: pl.LazyFrame
+    feature_names: list[str]
+    label_col_name: str
+    batch_size: int = DEFAULT_BATCH_SIZE
+
+    @classmethod
+    def from_path(
+        cls,
+        path: Path,
+        label_col_name: str,
+        id_col_name: str | None = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+    ) -> Self:
+        """Stream a CSV or Parquet file, using every column but the id and label as a feature."""
+        return cls.from_lazy(scan_file(path), label_col_name, id_col_name, batch_size)
+
+    @classmethod
+    def from_lazy(
+        cls,
+        lf: pl.LazyFrame,
+        label_col_name: str,
+        id_col_name: str | None = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+    ) -> Self:
+        """Stream a lazy frame, using every column but the id and label as a feature."""
+        feature_names = [
+            col for col in lf.collect_schema().names() if col not in {id_col_name, label_col_name}
+        ]
+        return cls(
+            lf=lf,
+            feature_names=feature_names,
+            label_col_name=label_col_name,
+            batch_size=batch_size,
+        )
+
+    def __iter__(self) -> Iterator[tuple[NDArray[np.float32], NDArray[np.float32]]]:
+        """Iterate over the feature matrix and labels of each batch."""
+        lf = self.lf.select(
+            pl.col(self.feature_names).cast(pl.Float32),
+            pl.col(self.label_col_name).cast(pl.Float32),
+        )
+        for batch in iter_batches(lf, self.batch_size):
+            features = batch.select(self.feature_names).to_numpy()
+            yield features, batch[self.label_col_name].to_numpy()
+
+    def count_rows(self) -> int:
+        """Count the rows of the dataset without loading it."""
+        return self.lf.select(pl.len()).collect().item()
+
+    def sample_features(self, sample_size: int, seed: int | None = None) -> NDArray[np.float32]:
+        """Draw a uniform sample of about `sample_size` rows of the feature matrix."""
+        rng = np.random.default_rng(seed)
+        probability = min(1.0, sample_size / max(self.count_rows(), 1))
+        samples = [features[rng.random(len(features)) < probability] for features, _ in self]
+        if not samples:
+            return np.empty((0, len(self.feature_names)), dtype=np.float32)
+        return np.concatenate(samples)
+
+
+def fit_streaming(
+    source: StreamingSource,
+    max_depth: int = 3,
+    min_samples_leaf: float = 1,
+    min_gain: float = 0.0,
+    criterion: SplitCriterion = gini_gain,
+    max_bins: int = MAX_BINS_UINT8,
+    sample_size: int = DEFAULT_SAMPLE_SIZE,
+    max_histogram_bytes: int = DEFAULT_MAX_HISTOGRAM_BYTES,
+    seed: int | None = None,
+) -> CompiledTree:
+    """Grow a tree level by level from a dataset that is read in batches.
+
+    The bin edges are found on a sample of about `sample_size` rows. Then each level of the tree
+    takes one pass over the data, routing every batch to the leaves of the tree grown so far and
+    adding it to their histograms. As in `Tree.fit`, only the smaller child of each split is counted
+    and its sibling's histograms are found by subtraction. Levels whose histograms take more than
+    `max_histogram_bytes` are counted in several passes, so memory is bounded by the batch size,
+    the sample size and `max_histogram_bytes`, not by the size of the dataset.
+
+    Nodes don't keep their rows, so the tree is returned in its compiled form.
+    """
+    bin_edges = find_bin_edges(source.sample_features(sample_size, seed), max_bins)
+    nodes = _StreamingNodes(source.feature_names)
+    # Each entry is a node to count from the data, with its larger sibling and their parent's
+    # histograms, except for the root which has neither
+    pairs: list[tuple[int, int | None, Histograms | None]] = [(nodes.add(), None, None)]
+    depth = 0
+    while pairs:
+        small_histograms = _build_level_histograms(
+            source,
+            nodes,
+            [small for small, _, _ in pairs],
+            bin_edges,
+            max_bins,
+            max_histogram_bytes,
+        )
+        frontier = []
+        for (small, large, parent_histograms), histograms in zip(
+            pairs, small_histograms, strict=True
+        ):
+            frontier.append((small, histograms))
+            if large is not None and parent_histograms is not None:
+                frontier.append((large, parent_histograms - histograms))
+
+        pairs = []
+        for node, histograms in frontier:
+            nodes.values[node] = _get_logodds(histograms)
+            if depth >= max_depth:
+                continue
+            thresholds, gains, missing_right = score_histograms(
+                histograms, bin_edges, criterion, min_samples_leaf
+            )
+            best = int(np.argmax(gains))
+            if not gains[best] > min_gain:
+                continue
+            left, right = nodes.split(
+                node, best, float(thresholds[best]), bool(missing_right[best])
+            )
+            goes_left = np.concatenate(
+                [bin_edges[best] <= thresholds[best], [False, not missing_right[best]]]
+            )
+            n_left = histograms.counts[best] @ goes_left
+            if n_left <= histograms.n_total - n_left:
+                pairs.append((left, right, histograms))
+            else:
+                pairs.append((right, left, histograms))
+        depth += 1
+    return nodes.compile()
+
+
+class _StreamingNodes:
+    """Growing struct-of-arrays tree, numbered like `CompiledTree.from_root`."""
+
+    def __init__(self, feature_names: list[str]) -> None:
+        self.feature_names = feature_names
+        self.feature_indices: list[int] = []
+        self.thresholds: list[float] = []
+        self.left_children: list[int] = []
+        self.right_children: list[int] = []
+        self.values: list[float] = []
+        self.missing_right: list[bool] = []
+
+    def add(self) -> int:
+        """Add a leaf and get its index."""
+        self.feature_indices.append(LEAF)
+        self.thresholds.append(float("nan"))
+        self.left_children.append(LEAF)
+        self.right_children.append(LEAF)
+        self.values.append(float("nan"))
+        self.missing_right.append(False)
+        return len(self.values) - 1
+
+    def split(
+        self, node: int, feature_index: int, threshold: float, missing_right: bool
+    ) -> tuple[int, int]:
+        """Split a leaf and get the indices of its children."""
+        self.feature_indices[node] = feature_index
+        self.thresholds[node] = threshold
+        self.missing_right[node] = missing_right
+        self.left_children[node] = self.add()
+        self.right_children[node] = self.add()
+        return self.left_children[node], self.right_children[node]
+
+    def compile(self) -> CompiledTree:
+        """Get the tree as a compiled tree."""
+        return CompiledTree(
+            feature_indices=np.array(self.feature_indices, dtype=np.intp),
+            thresholds=np.array(self.thresholds, dtype=np.float32),
+            left_children=np.array(self.left_children, dtype=np.intp),
+            right_children=np.array(self.right_children, dtype=np.intp),
+            values=np.array(self.values, dtype=np.float64),
+            missing_right=np.array(self.missing_right, dtype=np.bool_),
+            category_starts=np.zeros(len(self.values), dtype=np.intp),
+            category_ends=np.zeros(len(self.values), dtype=np.intp),
+            category_is_right=np.zeros(0, dtype=np.bool_),
+            feature_names=list(self.feature_names),
+        )
+
+
+def _build_level_histograms(
+    source: StreamingSource,
+    nodes: _StreamingNodes,
+    pending: list[int],
+    bin_edges: NDArray[np.float32],
+    max_bins: int,
+    max_histogram_bytes: int,
+) -> list[Histograms]:
+    """Count the histograms of the pending leaves, in as few passes as fit in memory."""
+    n_features = bin_edges.shape[0]
+    histogram_bytes = 2 * n_features * (max_bins + 1) * np.dtype(np.float64).itemsize
+    group_size = max(1, max_histogram_bytes // histogram_bytes)
+    tree = nodes.compile()
+    histograms = []
+    for start in range(0, len(pending), group_size):
+        histograms.extend(
+            _count_histograms(
+                source, tree, pending[start : start + group_size], bin_edges, max_bins
+            )
+        )
+    return histograms
+
+
+def _count_histograms(
+    source: StreamingSource,
+    tree: CompiledTree,
+    leaves: list[int],
+    bin_edges: NDArray[np.float32],
+    max_bins: int,
+) -> list[Histograms]:
+    """Count the histograms of some leaves of the tree in one pass over the data.
+
+    The histograms of all the leaves are stored as one flat array so that each batch is counted
+    with a single `bincount` over the (leaf, feature, bin) of every value.
+    """
+    n_features = bin_edges.shape[0]
+    n_columns = max_bins + 1
+    size = len(leaves) * n_features * n_columns
+    slots = np.full(tree.n_nodes, -1, dtype=np.intp)
+    slots[leaves] = np.arange(len(leaves))
+    feature_offsets = np.arange(n_features) * n_columns
+    counts = np.zeros(size)
+    positives = np.zeros(size)
+    for features, labels in source:
+        batch_slots = slots[tree.apply(features)]
+        is_counted = batch_slots >= 0
+        codes = assign_bins(features[is_counted], bin_edges, max_bins)
+        flat_indices = (
+            batch_slots[is_counted, None] * n_features * n_columns + feature_offsets
+        ) + codes
+        flat_indices = flat_indices.ravel()
+        counts += np.bincount(flat_indices, minlength=size)
+        positives += np.bincount(
+            flat_indices, weights=np.repeat(labels[is_counted], n_features), minlength=size
+        )
+    counts = counts.reshape(len(leaves), n_features, n_columns)
+    positives = positives.reshape(len(leaves), n_features, n_columns)
+    return [
+        Histograms(counts=leaf_counts, positives=leaf_positives)
+        for leaf_counts, leaf_positives in zip(counts, positives, strict=True)
+    ]
+
+
+def _get_logodds(histograms: Histograms) -> float:
+    """Get the log odds of a node from its histograms, like `trees.df.get_logodds`."""
+    if histograms.n_total == 0:
+        return float("nan")
+    if histograms.n_positive_total == 0:
+        return -100
+    if histograms.n_positive_total == histograms.n_total:
+        return 100
+    return float(
+        np.log(histograms.n_positive_total / (histograms.n_total - histograms.n_positive_total))
+    )
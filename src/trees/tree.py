@@ -1,48 +1,474 @@
 """Class for individual decision trees."""
 
-from dataclasses import dataclass
+import json
+from collections.abc import Collection
+from contextlib import AbstractContextManager, nullcontext
+from dataclasses import dataclass, field
+from functools import partial
+from pathlib import Path
+from typing import Literal, Self
 
 import numpy as np
-from bigtree.tree.search import find_name
+from numpy.typing import NDArray
 
-from trees.df import DataFrame
+from trees.binning import MAX_BINS_UINT8, BinnedFeatures
+from trees.compiled import FORMAT_VERSION, LEAF, CompiledTree, read_metadata
+from trees.df import DataFrame, get_logodds
 from trees.node import Node
+from trees.parallel import HistogramPool
+from trees.partition import RowPartition
+from trees.profiling import phase
+from trees.splitting.criterion import SplitCriterion
+from trees.splitting.gini import gini_gain
+from trees.splitting.histogram import (
+    Histograms,
+    get_best_categories,
+    score_category_histogram,
+    score_histograms,
+)
+from trees.splitting.split import SplitSuggestions
+from trees.splitting.stats import FeatureStats, StatsCache
 
 
 @dataclass
 class Tree:
-    """Individual decision tree."""
+    """Individual decision tree.
+
+    Nodes are indexed by id, so the tree must be changed through its methods for the index to stay
+    up to date.
+    """
 
     root: Node
     df: DataFrame
+    _compiled: CompiledTree | None = field(default=None, init=False, repr=False, compare=False)
+    _nodes: dict[int, Node] = field(default_factory=dict, init=False, repr=False, compare=False)
+    _next_id: int = field(default=0, init=False, repr=False, compare=False)
+    _stats: StatsCache = field(default_factory=StatsCache, init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        self._nodes = {node.id: node for node in [self.root, *self.root.descendants]}
+        self._next_id = max(self._nodes) + 1
+
+    @classmethod
+    def from_dataframe(cls, df: DataFrame, row_indices: NDArray[np.intp] | None = None) -> Self:
+        """Create a tree with a single root node holding the given rows of the dataframe.
+
+        By default the root holds every row. Row indices may repeat, as in bootstrap samples.
+        """
+        if row_indices is None:
+            row_indices = np.arange(len(df))
+        root_node = Node(
+            0,
+            parent=None,
+            partition=RowPartition(np.array(row_indices, dtype=np.intp)),
+            logodds=get_logodds(df.labels[row_indices]),
+        )
+        return cls(root=root_node, df=df)
+
+    @property
+    def compiled(self) -> CompiledTree:
+        """Get the flat-array form of the tree, recompiling it if the tree has changed."""
+        if self._compiled is None:
+            self._compiled = CompiledTree.from_root(self.root, self.df.feature_names)
+        return self._compiled
+
+    def save(self, path: Path, include_rows: bool = False) -> None:
+        """Save the tree as a directory of .npy files that `load` can memory-map.
+
+        The compiled form of the tree is saved alongside the nodes, so scoring processes can load
+        it with `CompiledTree.load` without the dataset. Nodes are stored parents first. With
+        `include_rows`, the row partition and the range of each node are saved too.
+        """
+        self.compiled.save(path)
+        nodes = self.nodes
+        positions = {node.id: i for i, node in enumerate(nodes)}
+        np.save(path / "node_ids.npy", np.array([node.id for node in nodes], dtype=np.int64))
+        np.save(
+            path / "node_parents.npy",
+            np.array(
+                [LEAF if node.parent is None else positions[node.parent.id] for node in nodes],
+                dtype=np.int64,
+            ),
+        )
+        np.save(path / "node_is_left.npy", np.array([node.is_left_child for node in nodes]))
+        np.save(
+            path / "node_feature_indices.npy",
+            np.array(
+                [
+                    self.df.feature_names.index(node.feature_name)
+                    if node.feature_name in self.df.feature_names
+                    else LEAF
+                    for node in nodes
+                ],
+                dtype=np.int64,
+            ),
+        )
+        np.save(path / "node_thresholds.npy", np.array([node.threshold for node in nodes]))
+        np.save(path / "node_missing_right.npy", np.array([node.missing_right for node in nodes]))
+        node_categories = [sorted(node.categories or ()) for node in nodes]
+        np.save(
+            path / "node_category_offsets.npy",
+            np.cumsum([0, *(len(categories) for categories in node_categories)], dtype=np.int64),
+        )
+        np.save(
+            path / "node_categories.npy",
+            np.array([code for categories in node_categories for code in categories], np.int64),
+        )
+        np.save(path / "node_logodds.npy", np.array([node.logodds for node in nodes]))
+        if include_rows:
+            np.save(path / "node_starts.npy", np.array([node.start for node in nodes]))
+            np.save(path / "node_ends.npy", np.array([node.end for node in nodes]))
+            np.save(path / "row_indices.npy", self.root.partition.row_indices)
+        metadata = {
+            "format_version": FORMAT_VERSION,
+            "n_nodes": self.compiled.n_nodes,
+            "n_features": len(self.df.feature_names),
+            "feature_names": self.df.feature_names,
+            "categories": self.df.categories,
+            "has_rows": include_rows,
+        }
+        (path / "metadata.json").write_text(json.dumps(metadata))
+
+    @classmethod
+    def load(cls, path: Path, df: DataFrame, mmap: bool = True) -> Self:
+        """Load a tree saved with `save` on top of the dataframe it was grown from.
 
-    def predict(self, features: list[float]) -> float:
-        """Predict the output for given features."""
-        # TODO: Implement the predict method
-        return 0.0
+        If the rows were saved, the row partition is memory-mapped copy-on-write unless `mmap` is
+        False, so it's shared between processes until a node is split. Otherwise the rows of the
+        nodes are found again by replaying the splits on the dataframe. Either way the nodes keep
+        their saved log odds.
+        """
+        metadata = read_metadata(path)
+        if metadata["feature_names"] != df.feature_names:
+            msg = f"Tree at {path} was saved with features {metadata['feature_names']}."
+            raise ValueError(msg)
+        if metadata["categories"] != df.categories:
+            msg = f"Tree at {path} was saved with categories {metadata['categories']}."
+            raise ValueError(msg)
+        node_ids = np.load(path / "node_ids.npy")
+        parents = np.load(path / "node_parents.npy")
+        is_left = np.load(path / "node_is_left.npy")
+        feature_indices = np.load(path / "node_feature_indices.npy")
+        thresholds = np.load(path / "node_thresholds.npy")
+        missing_right = np.load(path / "node_missing_right.npy")
+        logodds = np.load(path / "node_logodds.npy")
+        category_offsets = np.load(path / "node_category_offsets.npy")
+        category_codes = np.load(path / "node_categories.npy")
+
+        children = [[LEAF, LEAF] for _ in node_ids]
+        for i, parent in enumerate(parents):
+            if parent != LEAF:
+                children[parent][0 if is_left[i] else 1] = i
+
+        if metadata["has_rows"]:
+            mmap_mode: Literal["c"] | None = "c" if mmap else None
+            partition = RowPartition(np.load(path / "row_indices.npy", mmap_mode=mmap_mode))
+            starts = np.load(path / "node_starts.npy")
+            ends = np.load(path / "node_ends.npy")
+        else:
+            partition = RowPartition(np.arange(len(df)))
+        nodes = {0: Node(int(node_ids[0]), partition=partition)}
+        for i in range(len(node_ids)):
+            node = nodes[i]
+            if metadata["has_rows"]:
+                node.start, node.end = int(starts[i]), int(ends[i])
+            if feature_indices[i] != LEAF:
+                feature_name = df.feature_names[feature_indices[i]]
+                codes = category_codes[category_offsets[i] : category_offsets[i + 1]]
+                categories = frozenset(codes.tolist()) if len(codes) else None
+                if metadata["has_rows"] or children[i] == [LEAF, LEAF]:
+                    node.feature_name, node.threshold = feature_name, float(thresholds[i])
+                    node.categories, node.missing_right = categories, bool(missing_right[i])
+                else:
+                    left, right = (LEAF if j == LEAF else int(node_ids[j]) for j in children[i])
+                    node.split(
+                        feature_name,
+                        float(thresholds[i]),
+                        df,
+                        left_id=left,
+                        right_id=right,
+                        categories=categories,
+                        missing_right=bool(missing_right[i]),
+                    )
+            for side, j in zip(("left", "right"), children[i], strict=True):
+                if j == LEAF:
+                    setattr(node, side, None)
+                    continue
+                if getattr(node, side) is None:
+                    setattr(node, side, Node(int(node_ids[j]), parent=node, partition=partition))
+                nodes[j] = getattr(node, side)
+            node.logodds = float(logodds[i])
+        return cls(root=nodes[0], df=df)
+
+    def predict(self, features: NDArray[np.float32]) -> NDArray[np.float64]:
+        """Predict the log odds for each row of the feature matrix."""
+        return self.compiled.predict(np.atleast_2d(features))
+
+    @property
+    def n_nodes(self) -> int:
+        """Get the number of nodes in the tree."""
+        return len(self._nodes)
 
-    def get_node_by_id(self, node_id: str) -> Node:
+    @property
+    def nodes(self) -> list[Node]:
+        """Get all the nodes of the tree, parents before their children."""
+        return list(self._nodes.values())
+
+    def get_node_by_id(self, node_id: int) -> Node:
         """Get the node corresponding to the given id."""
-        node = find_name(self.root, node_id)
-        if not node:
+        node = self._nodes.get(node_id)
+        if node is None:
             msg = f"Node id {node_id} not found in the tree"
             raise KeyError(msg)
         return node
 
-    def split_node(self, node_id: str, feature_name: str, threshold: float) -> None:
-        """Split the node based on feature and threshold."""
+    def set_node_logodds(self, node_id: int, logodds: float) -> None:
+        """Overwrite the log odds of a node, e.g. with a boosting leaf value."""
+        self.get_node_by_id(node_id).logodds = logodds
+        self._compiled = None
+
+    def get_node_data(self, node_id: int) -> DataFrame:
+        """Get the rows of the dataset that belong to the given node."""
+        return self.df.take(self.get_node_by_id(node_id).row_indices)
+
+    def get_feature_stats(
+        self, node_id: int, feature_name: str, criterion: SplitCriterion = gini_gain
+    ) -> FeatureStats:
+        """Get the split and value statistics of a feature in a node.
+
+        Statistics are cached until evicted as least recently used. Node ids are never reused for
+        other rows, so the statistics of deleted nodes stay valid if they are restored later.
+        """
+        key = (node_id, feature_name, criterion)
+        return self._stats.get(key, partial(self._compute_feature_stats, *key))
+
+    def _compute_feature_stats(
+        self, node_id: int, feature_name: str, criterion: SplitCriterion
+    ) -> FeatureStats:
+        """Compute the statistics of a feature in a node from its rows."""
+        rows = self.get_node_by_id(node_id).row_indices
+        with phase("Tree.compute_feature_stats", len(rows)):
+            return FeatureStats.from_values(
+                self.df[feature_name][rows],
+                self.df.labels[rows],
+                criterion,
+                is_categorical=self.df.is_categorical(feature_name),
+            )
+
+    def suggest_splits(
+        self, node_id: int, criterion: SplitCriterion = gini_gain
+    ) -> SplitSuggestions:
+        """Find the best split of every feature for splitting a node, from the cache."""
+        stats = [
+            self.get_feature_stats(node_id, feature_name, criterion)
+            for feature_name in self.df.feature_names
+        ]
+        return SplitSuggestions(
+            self.df.feature_names,
+            np.array([feature_stats.best_threshold for feature_stats in stats], dtype=np.float32),
+            np.array([feature_stats.best_gain for feature_stats in stats]),
+            np.array([feature_stats.best_missing_right for feature_stats in stats]),
+            {
+                feature_name: feature_stats.best_categories
+                for feature_name, feature_stats in zip(self.df.feature_names, stats, strict=True)
+                if feature_stats.best_categories
+            },
+        )
+
+    def split_node(
+        self,
+        node_id: int,
+        feature_name: str,
+        threshold: float = float("nan"),
+        categories: Collection[int] | None = None,
+        missing_right: bool = False,
+    ) -> None:
+        """Split the node based on feature and threshold.
+
+        Nodes are split on a categorical feature by the codes of the categories to send to the
+        right child instead of a threshold, of which there must be at least one. Rows missing the
+        feature go to the left child unless `missing_right` is set.
+        """
         node = self.get_node_by_id(node_id)
         node.split(
             feature_name,
             threshold,
-            df=self.df.get_rows_by_ids(node.data_ids),
+            df=self.df,
+            left_id=self._next_id,
+            right_id=self._next_id + 1,
+            categories=None if categories is None else frozenset(int(code) for code in categories),
+            missing_right=missing_right,
         )
+        self._next_id += 2
+        self._compiled = None
         if node.left is None or node.right is None:
             msg = f"Failed to split node: number of children is {len(node.children)}"
             raise ValueError(msg)
+        self._nodes[node.left.id] = node.left
+        self._nodes[node.right.id] = node.right
+
+    def update_index(self, removed: list[Node], added: Node | None) -> None:
+        """Update the node index after a subtree of the tree was swapped for another one.
+
+        `removed` are the nodes of the old subtree and `added` is the root of the new one, already
+        attached to the tree with its rows in place. Used by `trees.history` to go back to earlier
+        versions of the tree.
+        """
+        for node in removed:
+            self._nodes.pop(node.id, None)
+        if added is not None:
+            self._nodes.update((node.id, node) for node in [added, *added.descendants])
+        self._compiled = None
+
+    def fit(
+        self,
+        max_depth: int = 3,
+        min_samples_leaf: float = 1,
+        min_gain: float = 0.0,
+        criterion: SplitCriterion = gini_gain,
+        max_bins: int = MAX_BINS_UINT8,
+        n_workers: int = 1,
+        use_processes: bool = True,
+        targets: NDArray[np.float64] | None = None,
+        sample_weight: NDArray[np.float64] | None = None,
+        feature_names: list[str] | None = None,
+        pool: HistogramPool | None = None,
+    ) -> None:
+        """Grow the tree greedily from its current leaves, one level at a time.
+
+        Splits are searched on per-bin histograms, using the bins of the dataframe if it has them
+        and otherwise binning the features into at most `max_bins` bins. Only the histograms of the
+        smaller child of each split are built from the data, the larger child's histograms are the
+        parent's minus the smaller child's. The histograms of each level are built on `n_workers`
+        processes (or threads), which gives the same tree as growing it serially.
+
+        By default the criterion sees the number of observations and positive labels on each side of
+        a split. With `targets` and `sample_weight`, it sees the sums of the weights and of the
+        weighted targets instead, and `min_samples_leaf` applies to the sum of the weights. If
+        `feature_names` are given, splits are only made on them and histograms are only built for
+        them. Categorical features are split into the subsets of their bins that score best when the
+        bins are ordered by their mean target. Missing values go to whichever child scores best.
+
+        A started `pool` on the bin codes of the dataframe, or of `feature_names` if given, can be
+        passed to reuse its workers and shared memory over several trees, e.g. the rounds of
+        boosting. The labels or targets and the weights of this fit are put in it, and `n_workers`
+        and `use_processes` are ignored.
+        """
+        bins = (
+            self.df.bins
+            if self.df.bins is not None
+            else BinnedFeatures.from_features(self.df.features, max_bins)
+        )
+        if feature_names is None:
+            columns = np.arange(len(self.df.feature_names))
+            codes = bins.codes
+        else:
+            columns = np.flatnonzero(np.isin(self.df.feature_names, feature_names))
+            if len(columns) == 0:
+                msg = f"None of the features {feature_names} are in the dataframe."
+                raise ValueError(msg)
+            codes = bins.codes[:, columns]
+        bin_edges = bins.bin_edges[columns]
+        labels = self.df.labels if targets is None else targets
+        context: AbstractContextManager[HistogramPool]
+        if pool is None:
+            context = HistogramPool(
+                codes, labels, bins.max_bins, n_workers, use_processes, sample_weight
+            )
+        elif pool.builder.codes.shape[1] != len(columns):
+            msg = (
+                f"The pool has codes of {pool.builder.codes.shape[1]} features, not {len(columns)}."
+            )
+            raise ValueError(msg)
+        else:
+            pool.update(labels, sample_weight)
+            context = nullcontext(pool)
+        with context as active_pool:
+            leaves = list(self.root.leaves)
+            with phase("Tree.fit.histograms", sum(leaf.n_obs for leaf in leaves)):
+                root_histograms = active_pool.map([leaf.row_indices for leaf in leaves])
+            frontier = list(zip(leaves, root_histograms, strict=True))
+            while frontier:
+                split_nodes = []
+                for node, histograms in frontier:
+                    if node.depth >= max_depth:
+                        continue
+                    thresholds, gains, missing_right = score_histograms(
+                        histograms, bin_edges, criterion, min_samples_leaf
+                    )
+                    category_splits = self._score_categories(
+                        histograms, bins, columns, criterion, min_samples_leaf, gains, missing_right
+                    )
+                    best = int(np.argmax(gains))
+                    if gains[best] > min_gain:
+                        self.split_node(
+                            node.id,
+                            self.df.feature_names[columns[best]],
+                            float(thresholds[best]),
+                            category_splits.get(best),
+                            bool(missing_right[best]),
+                        )
+                        split_nodes.append((node, histograms))
+                frontier = self._get_child_histograms(split_nodes, active_pool)
 
-    def delete_node(self, node_id: str, make_new_leaf: bool = True) -> None:
-        """Delete the node corresponding to the given id."""
+    def _score_categories(
+        self,
+        histograms: Histograms,
+        bins: BinnedFeatures,
+        columns: NDArray[np.intp],
+        criterion: SplitCriterion,
+        min_samples_leaf: float,
+        gains: NDArray[np.float64],
+        missing_right: NDArray[np.bool_],
+    ) -> dict[int, frozenset[int]]:
+        """Overwrite the scores of the categorical features with those of their best subset splits.
+
+        The histograms are those of the features at `columns`. Both the gains and the missing value
+        directions are overwritten. Returns the codes of the categories sent right by each
+        categorical feature's best split, by position in the histograms.
+        """
+        category_splits = {}
+        for j, feature_index in enumerate(columns):
+            feature_name = self.df.feature_names[feature_index]
+            if not self.df.is_categorical(feature_name):
+                continue
+            gains[j], right_bins, missing_right[j] = get_best_categories(
+                *score_category_histogram(
+                    histograms.counts[j], histograms.positives[j], criterion, min_samples_leaf
+                )
+            )
+            category_splits[j] = bins.get_values_in_bins(
+                feature_index, right_bins, len(self.df.categories[feature_name])
+            )
+        return category_splits
+
+    def _get_child_histograms(
+        self, split_nodes: list[tuple[Node, Histograms]], pool: HistogramPool
+    ) -> list[tuple[Node, Histograms]]:
+        """Get the histograms of the children of freshly split nodes.
+
+        The histograms of the smaller children are built on the pool, those of their siblings are
+        found by subtraction from the parent.
+        """
+        pairs = [
+            sorted((node.left, node.right), key=lambda child: child.n_obs)
+            for node, _ in split_nodes
+        ]
+        with phase("Tree.fit.histograms", sum(small.n_obs for small, _ in pairs)):
+            small_histograms = pool.map([small.row_indices for small, _ in pairs])
+        children = []
+        for (_, histograms), (small, large), small_hist in zip(
+            split_nodes, pairs, small_histograms, strict=True
+        ):
+            children.extend([(small, small_hist), (large, histograms - small_hist)])
+        return children
+
+    def delete_node(self, node_id: int, make_new_leaf: bool = True) -> None:
+        """Delete the node corresponding to the given id.
+
+        A split node is replaced by a leaf with the same id, rows and log odds, unless
+        `make_new_leaf` is False.
+        """
         node = self.get_node_by_id(node_id)
         if node is None:
             msg = f"Node with id {node_id} not found."
@@ -50,17 +476,26 @@ class Tree:
         if node.is_root:
             msg = "Can't delete root node."
             raise ValueError(msg)
-        if not node.is_leaf and make_new_leaf:
-            combined_ids = np.concat([node.left.data_ids, node.right.data_ids])
-            new_leaf = Node(
-                name=node.id,
-                data_ids=combined_ids,
-                logodds=self.df.get_rows_by_ids(combined_ids).get_logodds(),
-            )
-        else:
-            new_leaf = None
-        if node.is_left_child:
-            node.parent.left = new_leaf
-        elif node.is_right_child:
-            node.parent.right = new_leaf
-        del node.children
+        with phase("Tree.delete_node", node.n_obs):
+            if not node.is_leaf and make_new_leaf:
+                # The children partition the range of the node, so the leaf gets the same range back
+                new_leaf = Node(
+                    node.id,
+                    parent=node.parent,
+                    partition=node.partition,
+                    start=node.start,
+                    end=node.end,
+                    logodds=node.logodds,
+                )
+            else:
+                new_leaf = None
+            for removed in [node, *node.descendants]:
+                del self._nodes[removed.id]
+            if new_leaf is not None:
+                self._nodes[new_leaf.id] = new_leaf
+            if node.is_left_child:
+                node.parent.left = new_leaf
+            elif node.is_right_child:
+                node.parent.right = new_leaf
+            node.parent = None
+        self._compiled = None
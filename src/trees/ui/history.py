@@ -0,0 +1,47 @@
+"""Sidebar for undoing, redoing and snapshotting edits of the tree in streamlit."""
+
+import streamlit as st
+
+from trees.tree import Tree
+from trees.ui.session_state import (
+    SessionState,
+    get_subtree_ids,
+    patch_session_state,
+    update_session_state,
+)
+
+
+def show_history_sidebar() -> None:
+    """Show undo and redo buttons, and controls to save and restore named snapshots."""
+    st.sidebar.header("History")
+    history = SessionState().history
+    tree = history.tree
+    col1, col2 = st.sidebar.columns(2)
+    with col1:
+        if st.button("Undo", disabled=not history.can_undo) and history.undo_node_id is not None:
+            previous_ids = _get_previous_ids(tree, history.undo_node_id)
+            patch_session_state(tree, history.undo(), previous_ids)
+            st.rerun()
+    with col2:
+        if st.button("Redo", disabled=not history.can_redo) and history.redo_node_id is not None:
+            previous_ids = _get_previous_ids(tree, history.redo_node_id)
+            patch_session_state(tree, history.redo(), previous_ids)
+            st.rerun()
+
+    name = st.sidebar.text_input("Snapshot name")
+    if st.sidebar.button("Save snapshot", disabled=not name):
+        history.save_snapshot(name)
+    if history.snapshot_names:
+        selected = st.sidebar.selectbox("Snapshot", options=history.snapshot_names)
+        if st.sidebar.button("Restore snapshot"):
+            history.restore_snapshot(selected)
+            update_session_state(tree)
+            st.rerun()
+
+
+def _get_previous_ids(tree: Tree, node_id: int) -> set[str]:
+    """Get the flow ids of the subtree of a node, which is missing if the node was deleted."""
+    try:
+        return get_subtree_ids(tree, node_id)
+    except KeyError:
+        return set()
@@ -1,56 +1,75 @@
 """Helpers for displaying nodes in streamlit."""
 
+import math
+
 import streamlit as st
 
-from trees.splitting.split import suggest_split_threshold
-from trees.ui.session_state import SessionState, update_session_state
+from trees.ui.session_state import SessionState, get_subtree_ids, patch_session_state
 
 
 def split_selected_node() -> None:
     """Split the selected node into two new nodes when the button is pressed."""
     st.write("Split Node")
     selected_id = SessionState().curr_state.selected_id
+    tree = SessionState().tree
+    suggestions = tree.suggest_splits(int(selected_id)) if selected_id else None
+    feature_names = tree.df.feature_names
+    leaderboard = suggestions.leaderboard if suggestions else []
     feature_name = st.selectbox(
         "Feature Name",
-        options=SessionState().tree.df.feature_names,
+        options=feature_names,
+        index=feature_names.index(leaderboard[0][0]) if leaderboard else 0,
     )
 
-    selected_node = SessionState().tree.get_node_by_id(selected_id) if selected_id else None
-    metric, suggested_threshold = (
-        suggest_split_threshold(
-            df=SessionState().tree.df.get_rows_by_ids(selected_node.data_ids),
-            feature=feature_name,
+    stats = tree.get_feature_stats(int(selected_id), feature_name) if selected_id else None
+    gain = stats.best_gain if stats else None
+    suggested_threshold = stats.best_threshold if stats else None
+    if gain is not None and not math.isfinite(gain):
+        gain, suggested_threshold = None, None
+    categories = None
+    if tree.df.is_categorical(feature_name):
+        category_names = tree.df.categories[feature_name]
+        suggested_categories = stats.best_categories if stats else None
+        selected_names = st.multiselect(
+            "Categories to send right",
+            options=category_names,
+            default=[category_names[code] for code in sorted(suggested_categories or ())],
         )
-        if selected_node
-        else (None, None)
-    )
-    min_value = (
-        SessionState().tree.df.get_rows_by_ids(selected_node.data_ids)[feature_name].min().tolist()
-        if selected_node
-        else None
-    )
-    max_value = (
-        SessionState().tree.df.get_rows_by_ids(selected_node.data_ids)[feature_name].max().tolist()
-        if selected_node
-        else None
-    )
-    threshold = st.slider(
-        "Threshold",
-        value=suggested_threshold.tolist() if suggested_threshold else 0.0,
-        min_value=min_value or 0.0,
-        max_value=max_value or 100.0,
+        categories = [category_names.index(name) for name in selected_names]
+        threshold = math.nan
+    else:
+        min_value = stats.min_value if stats and math.isfinite(stats.min_value) else None
+        max_value = stats.max_value if stats and math.isfinite(stats.max_value) else None
+        threshold = st.slider(
+            "Threshold",
+            value=suggested_threshold if suggested_threshold is not None else 0.0,
+            min_value=min_value or 0.0,
+            max_value=max_value or 100.0,
+        )
+    missing_right = st.checkbox(
+        "Send missing values right", value=stats.best_missing_right if stats else False
     )
-    st.markdown(f"*metric* = {metric or 0:.3f}")
-    submitted = st.button("Split selected node")
+    st.markdown(f"*gain* = {gain or 0:.3f}")
+    with st.expander("Best split per feature"):
+        st.table(
+            [
+                {"feature": name, "gain": feature_gain, "threshold": feature_threshold}
+                for name, feature_gain, feature_threshold in leaderboard
+            ]
+        )
+    # Categorical splits need at least one category to send right
+    submitted = st.button("Split selected node", disabled=categories == [])
     if submitted:
         if selected_id is None:
             return
-        SessionState().tree.split_node(
-            selected_id,
+        SessionState().history.split_node(
+            int(selected_id),
             feature_name,
             threshold,
+            categories,
+            missing_right,
         )
-        update_session_state(SessionState().tree)
+        patch_session_state(tree, int(selected_id), {selected_id})
         st.rerun()
 
 
@@ -60,6 +79,8 @@ def delete_selected_node() -> None:
         id_to_delete = SessionState().curr_state.selected_id
         if id_to_delete is None:
             return
-        SessionState().tree.delete_node(id_to_delete)
-        update_session_state(SessionState().tree)
+        tree = SessionState().tree
+        previous_ids = get_subtree_ids(tree, int(id_to_delete))
+        SessionState().history.delete_node(int(id_to_delete))
+        patch_session_state(tree, int(id_to_delete), previous_ids)
         st.rerun()
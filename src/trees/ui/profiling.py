@@ -0,0 +1,23 @@
+"""Sidebar for profiling the phases of editing the tree in streamlit."""
+
+import streamlit as st
+
+from trees import profiling
+
+
+def show_profiling_sidebar() -> None:
+    """Show a toggle for profiling and a table of the time and memory spent in each phase."""
+    st.sidebar.header("Profiling")
+    if st.sidebar.toggle("Profile tree edits", value=profiling.is_enabled()):
+        if not profiling.is_enabled():
+            profiling.enable()
+    elif profiling.is_enabled():
+        profiling.disable()
+    if st.sidebar.button("Reset profile"):
+        profiling.reset()
+
+    summary = profiling.get_summary()
+    if summary:
+        st.sidebar.dataframe(summary, hide_index=True)
+    else:
+        st.sidebar.caption("No phases profiled yet.")
@@ -1,11 +1,14 @@
 """Helpers for keeping track of session state in streamlit."""
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from datetime import datetime
 
 from streamlit_flow.elements import StreamlitFlowEdge, StreamlitFlowNode
 from streamlit_flow.state import StreamlitFlowState
 
+from trees.history import TreeHistory
 from trees.node import Node
+from trees.profiling import phase
 from trees.tree import Tree
 
 
@@ -14,8 +17,12 @@ class _SessionState:
     """Keeps track of the session state."""
 
     _tree: Tree | None = None
+    _history: TreeHistory | None = None
     _flow_state: StreamlitFlowState | None = None
     _curr_state: StreamlitFlowState | None = None
+    # Flow nodes by id and flow edges by the id of their target node, in display order
+    _flow_nodes: dict[str, StreamlitFlowNode] = field(default_factory=dict)
+    _flow_edges: dict[str, StreamlitFlowEdge] = field(default_factory=dict)
 
     @property
     def is_initialized(self) -> bool:
@@ -36,6 +43,20 @@ class _SessionState:
         """Set the tree for the session."""
         self._tree = tree
 
+    @property
+    def history(self) -> TreeHistory:
+        """Get the edit history of the session tree."""
+        if self._history is None:
+            msg = "Session history not set."
+            raise ValueError(msg)
+
+        return self._history
+
+    @history.setter
+    def history(self, history: TreeHistory) -> None:
+        """Set the edit history of the session tree."""
+        self._history = history
+
     @property
     def flow_state(self) -> StreamlitFlowState:
         """Get the flow state for the session."""
@@ -48,6 +69,20 @@ class _SessionState:
     @flow_state.setter
     def flow_state(self, flow_state: StreamlitFlowState) -> None:
         self._flow_state = flow_state
+        self._flow_nodes = {node.id: node for node in flow_state.nodes}
+        self._flow_edges = {edge.target: edge for edge in flow_state.edges}
+
+    def apply_flow_patch(self, patch: "FlowPatch") -> None:
+        """Patch the flow state in place with the nodes and edges changed by a tree edit."""
+        for node_id in patch.removed_node_ids:
+            self._flow_nodes.pop(node_id, None)
+            self._flow_edges.pop(node_id, None)
+        self._flow_nodes.update((node.id, node) for node in patch.nodes)
+        self._flow_edges.update((edge.target, edge) for edge in patch.edges)
+        self.flow_state.nodes = list(self._flow_nodes.values())
+        self.flow_state.edges = list(self._flow_edges.values())
+        # The flow component only picks up states with a newer timestamp
+        self.flow_state.timestamp = int(datetime.now().timestamp() * 1000)
 
     @property
     def curr_state(self) -> StreamlitFlowState:
@@ -79,21 +114,21 @@ class SessionState:
 def get_edges_from_node(node: Node) -> list[StreamlitFlowEdge]:
     """Get edges from a list of nodes."""
     edges = []
-    if node.left_child:
+    if node.left:
         edges.append(
             StreamlitFlowEdge(
-                f"{node.id}-{node.left_child.id}",
-                node.id,
-                node.left_child.id,
+                f"{node.id}-{node.left.id}",
+                str(node.id),
+                str(node.left.id),
                 animated=True,
             )
         )
-    if node.right_child:
+    if node.right:
         edges.append(
             StreamlitFlowEdge(
-                f"{node.id}-{node.right_child.id}",
-                node.id,
-                node.right_child.id,
+                f"{node.id}-{node.right.id}",
+                str(node.id),
+                str(node.right.id),
                 animated=True,
             )
         )
@@ -108,11 +143,12 @@ def get_edges_from_nodes(nodes: list[Node]) -> list[StreamlitFlowEdge]:
     return edges
 
 
-def get_flownode_from_node(node: Node) -> StreamlitFlowNode:
-    """Convert a Node to a StreamlitFlowNode."""
+def get_flownode_from_node(node: Node, depth: int | None = None) -> StreamlitFlowNode:
+    """Convert a Node to a StreamlitFlowNode, at the given depth if it's already known."""
+    depth = node.depth if depth is None else depth
     return StreamlitFlowNode(
-        node.id,
-        (-10 if node.is_left_child else 10, node.depth * 10),
+        str(node.id),
+        (-10 if node.is_left_child else 10, depth * 10),
         {"content": _get_node_content(node)},
         node_type="input" if node.is_root else "default",
         source_position="bottom",
@@ -122,9 +158,17 @@ def get_flownode_from_node(node: Node) -> StreamlitFlowNode:
 
 def _get_node_content(node: Node) -> str:
     """Get the content of a node."""
-    feature_part = f"{node.feature_name} <= {node.threshold:.1f}" if node.feature_name else "Leaf"
-    log_odds_part = f" (logp={node.logodds:.2f}, n={len(node.data_ids):,})"
-    return f"{feature_part}{log_odds_part}"
+    if node.categories is not None:
+        category_names = SessionState().tree.df.categories[node.feature_name]
+        right_names = ", ".join(category_names[code] for code in sorted(node.categories))
+        feature_part = f"{node.feature_name} in {{{right_names}}}"
+    else:
+        feature_part = (
+            f"{node.feature_name} <= {node.threshold:.1f}" if node.feature_name else "Leaf"
+        )
+    missing_part = ", missing right" if node.missing_right else ""
+    log_odds_part = f" (logp={node.logodds:.2f}, n={node.n_obs:,})"
+    return f"{feature_part}{missing_part}{log_odds_part}"
 
 
 def get_flownodes_from_nodes(nodes: list[Node]) -> list[StreamlitFlowNode]:
@@ -135,6 +179,62 @@ def get_flownodes_from_nodes(nodes: list[Node]) -> list[StreamlitFlowNode]:
 def update_session_state(tree: Tree) -> None:
     """Update the session state with the current tree and flow state."""
     SessionState().tree = tree
-    flow_nodes = get_flownodes_from_nodes(SessionState().tree.nodes)
-    flow_edges = get_edges_from_nodes(SessionState().tree.nodes)
-    SessionState().flow_state = StreamlitFlowState(flow_nodes, flow_edges)
+    with phase("flow_state.rebuild", tree.n_nodes):
+        flow_nodes = get_flownodes_from_nodes(SessionState().tree.nodes)
+        flow_edges = get_edges_from_nodes(SessionState().tree.nodes)
+        SessionState().flow_state = StreamlitFlowState(flow_nodes, flow_edges)
+
+
+@dataclass
+class FlowPatch:
+    """Flow nodes and edges added or changed by a tree edit, and the ids of removed nodes.
+
+    Edges are identified by their target node, so removing a node also removes its incoming edge.
+    """
+
+    nodes: list[StreamlitFlowNode]
+    edges: list[StreamlitFlowEdge]
+    removed_node_ids: set[str]
+
+
+def get_subtree_ids(tree: Tree, node_id: int) -> set[str]:
+    """Get the flow ids of a node and its descendants, to pass to `patch_session_state`."""
+    node = tree.get_node_by_id(node_id)
+    return {str(subtree_node.id) for subtree_node in [node, *node.descendants]}
+
+
+def get_flow_patch(tree: Tree, node_id: int, previous_ids: set[str]) -> FlowPatch:
+    """Get the changes to the flow state after the subtree of a node was edited.
+
+    `previous_ids` are the flow ids of the subtree before the edit. Only the subtree is visited, so
+    the cost doesn't depend on the size of the rest of the tree.
+    """
+    try:
+        node = tree.get_node_by_id(node_id)
+    except KeyError:
+        return FlowPatch(nodes=[], edges=[], removed_node_ids=previous_ids)
+
+    nodes = []
+    edges = []
+    stack = [(node, node.depth)]
+    while stack:
+        subtree_node, depth = stack.pop()
+        nodes.append(get_flownode_from_node(subtree_node, depth))
+        edges.extend(get_edges_from_node(subtree_node))
+        stack.extend((child, depth + 1) for child in reversed(subtree_node.children))
+    if node.parent is not None:
+        edges.extend(
+            edge for edge in get_edges_from_node(node.parent) if edge.target == str(node.id)
+        )
+    return FlowPatch(
+        nodes=nodes,
+        edges=edges,
+        removed_node_ids=previous_ids - {flow_node.id for flow_node in nodes},
+    )
+
+
+def patch_session_state(tree: Tree, node_id: int, previous_ids: set[str]) -> None:
+    """Update the flow state after an edit of the subtree of a node, without rebuilding it."""
+    SessionState().tree = tree
+    with phase("flow_state.patch", len(previous_ids)):
+        SessionState().apply_flow_patch(get_flow_patch(tree, node_id, previous_ids))
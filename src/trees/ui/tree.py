@@ -2,7 +2,7 @@
 
 import streamlit as st
 
-from trees.node import Node
+from trees.history import TreeHistory
 from trees.tree import Tree
 from trees.ui.data import load_data
 from trees.ui.session_state import SessionState, update_session_state
@@ -12,18 +12,6 @@ def initialize_tree() -> None:
     """Initialize a default tree structure in the session state."""
     should_reset = st.button("Reset")
     if not SessionState().is_initialized or should_reset:
-        dataset = load_data("diabetes")
-        root_node = Node(
-            id="root",
-            parent=None,
-            logodds=dataset.get_logodds(),
-            data_ids=dataset.ids,
-        )
-        tree = Tree(
-            nodes=[
-                root_node,
-            ],
-            root=root_node,
-            df=dataset,
-        )
+        tree = Tree.from_dataframe(load_data("diabetes"))
+        SessionState().history = TreeHistory(tree)
         update_session_state(tree)
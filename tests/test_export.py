@@ -0,0 +1,15 @@
+"""Tests for exporting trees to bigtree."""
+
+import sys
+
+import pytest
+
+from trees.data.synthetic import make_dataframe
+from trees.tree import Tree
+
+
+def test_show_without_bigtree_raises(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setitem(sys.modules, "bigtree", None)
+    tree = Tree.from_dataframe(make_dataframe(10, 2))
+    with pytest.raises(ImportError, match="display extra"):
+        tree.root.show()
@@ -0,0 +1,34 @@
+"""Tests for undoing and redoing edits of a tree."""
+
+import numpy as np
+
+from trees.data.synthetic import make_dataframe
+from trees.history import TreeHistory
+from trees.tree import Tree
+
+
+def _rows(tree: Tree) -> dict[int, frozenset[int]]:
+    return {
+        node.id: frozenset(node.row_indices.tolist())
+        for node in [tree.root, *tree.root.descendants]
+    }
+
+
+def test_undo_puts_back_the_rows_of_a_resplit_subtree() -> None:
+    df = make_dataframe(1000, 4, nan_rate=0.1)
+    history = TreeHistory(Tree.from_dataframe(df))
+    history.split_node(0, df.feature_names[0], 0.0)
+    left_id = history.tree.root.left.id
+    history.split_node(left_id, df.feature_names[1], 0.0, missing_right=True)
+    history.split_node(history.tree.root.left.left.id, df.feature_names[2], 0.5)
+    before = _rows(history.tree)
+
+    history.delete_node(left_id)
+    history.split_node(left_id, df.feature_names[3], -0.5)
+    history.undo()
+    history.undo()
+
+    assert _rows(history.tree) == before
+    predictions = history.tree.predict(df.features)
+    for leaf in history.tree.root.leaves:
+        np.testing.assert_array_equal(predictions[leaf.row_indices], leaf.logodds)
@@ -0,0 +1,25 @@
+"""Tests for building histograms on a pool of workers."""
+
+import numpy as np
+import pytest
+
+from trees.parallel import HistogramPool
+
+
+def test_update_rejects_other_dtypes() -> None:
+    rng = np.random.default_rng(0)
+    codes = rng.integers(0, 8, (100, 3)).astype(np.uint8)
+    labels = rng.random(100).astype(np.float32)
+    with HistogramPool(codes, labels, max_bins=8, n_workers=2) as pool:
+        with pytest.raises(ValueError, match="shapes and dtypes"):
+            pool.update(labels.astype(np.float64))
+        with pytest.raises(ValueError, match="shapes and dtypes"):
+            pool.update(labels, weights=np.ones(100))
+
+        new_labels = rng.random(100).astype(np.float32)
+        pool.update(new_labels)
+        rows = np.arange(0, 100, 3)
+        expected = HistogramPool(codes, new_labels, max_bins=8).map([rows])[0]
+        (histograms,) = pool.map([rows])
+    np.testing.assert_array_equal(histograms.counts, expected.counts)
+    np.testing.assert_array_equal(histograms.positives, expected.positives)
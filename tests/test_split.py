@@ -0,0 +1,52 @@
+"""Tests for splitting nodes by hand."""
+
+import numpy as np
+import polars as pl
+import pytest
+
+from trees.compiled import CompiledTree
+from trees.df import DataFrame
+from trees.tree import Tree
+
+
+@pytest.fixture
+def tree() -> Tree:
+    rng = np.random.default_rng(0)
+    df = pl.DataFrame(
+        {
+            "id": np.arange(100),
+            "color": rng.choice(["red", "green", "blue"], 100),
+            "size": rng.standard_normal(100),
+            "label": rng.integers(0, 2, 100),
+        }
+    )
+    return Tree.from_dataframe(DataFrame.from_polars(df, "id", "label"))
+
+
+def test_split_without_categories_is_rejected(tree: Tree) -> None:
+    with pytest.raises(ValueError, match="at least one category"):
+        tree.split_node(0, "color", categories=[])
+    assert tree.root.is_leaf
+    assert tree.compiled.n_nodes == 1
+
+
+def test_split_without_threshold_is_rejected(tree: Tree) -> None:
+    with pytest.raises(ValueError, match="need a threshold"):
+        tree.split_node(0, "size")
+    assert tree.root.is_leaf
+
+
+def test_split_sends_categories_right(tree: Tree) -> None:
+    tree.split_node(0, "color", categories=[0, 2])
+    features = np.array([[0, 0.0], [1, 0.0], [2, 0.0], [np.nan, 0.0]], dtype=np.float32)
+    leaves = tree.compiled.apply(features)
+    right = tree.compiled.right_children[0]
+    assert (leaves == right).tolist() == [True, False, True, False]
+
+
+def test_compiling_split_without_categories_sends_rows_left(tree: Tree) -> None:
+    tree.split_node(0, "color", categories=[1])
+    tree.root.categories = frozenset()
+    compiled = CompiledTree.from_root(tree.root, tree.df.feature_names)
+    features = np.array([[0, 0.0], [1, 0.0], [2, 0.0]], dtype=np.float32)
+    assert (compiled.apply(features) == compiled.left_children[0]).all()
@@ -0,0 +1,63 @@
+"""Tests for the cache of feature statistics."""
+
+import numpy as np
+
+from trees.data.synthetic import make_dataframe
+from trees.splitting.stats import FeatureStats, StatsCache
+from trees.tree import Tree
+
+
+def _stats(n_thresholds: int) -> FeatureStats:
+    return FeatureStats(
+        thresholds=np.zeros(n_thresholds, dtype=np.float32),
+        gains=np.zeros(n_thresholds),
+        missing_right=np.zeros(n_thresholds, dtype=np.bool_),
+        min_value=0.0,
+        max_value=1.0,
+        n_obs=n_thresholds,
+        n_positive=0.0,
+    )
+
+
+def test_cache_is_bounded_by_bytes() -> None:
+    # 13 bytes per threshold
+    cache = StatsCache(max_bytes=13 * 250)
+    for node_id in range(3):
+        cache.get((node_id, "x", None), lambda: _stats(100))
+    assert len(cache) == 2
+    assert cache.nbytes == 13 * 200
+
+    large = _stats(1000)
+    assert cache.get((3, "x", None), lambda: large) is large
+    assert len(cache) == 2
+    assert cache.nbytes <= cache.max_bytes
+
+
+def test_node_ids_keep_their_rows_across_edits() -> None:
+    df = make_dataframe(2000, 4)
+    tree = Tree.from_dataframe(df)
+    tree.split_node(0, df.feature_names[0], 0.0)
+    left_id = tree.root.left.id
+    tree.split_node(left_id, df.feature_names[1], 0.0)
+    cached = {
+        node.id: tree.get_feature_stats(node.id, df.feature_names[2])
+        for node in [tree.root, *tree.root.descendants]
+    }
+
+    # Deleting and splitting the node again reorders its rows and gives its children new ids
+    tree.delete_node(left_id)
+    tree.split_node(left_id, df.feature_names[3], 0.5)
+    assert not {child.id for child in tree.get_node_by_id(left_id).children} & cached.keys()
+
+    fresh = Tree.from_dataframe(df)
+    fresh.split_node(0, df.feature_names[0], 0.0)
+    fresh.split_node(fresh.root.left.id, df.feature_names[3], 0.5)
+    for node, fresh_node in zip(
+        [tree.root, *tree.root.descendants], [fresh.root, *fresh.root.descendants], strict=True
+    ):
+        stats = tree.get_feature_stats(node.id, df.feature_names[2])
+        if node.id in cached:
+            assert stats is cached[node.id]
+        expected = fresh.get_feature_stats(fresh_node.id, df.feature_names[2])
+        np.testing.assert_array_equal(stats.gains, expected.gains)
+        np.testing.assert_array_equal(stats.thresholds, expected.thresholds)
@@ -0,0 +1,61 @@
+"""Tests for the XGBoost gain criteria."""
+
+import numpy as np
+
+from trees.splitting.xgb import NewtonGain, XGBoostGain
+
+
+def _numpy_gain(grad_left, hess_left, grad_total, hess_total, reg_lambda, gamma):
+    """Calculate the XGBoost gain in float64 with numpy."""
+
+    def score(grad, hess):
+        return grad**2 / (hess + reg_lambda)
+
+    return (
+        0.5
+        * (
+            score(grad_left, hess_left)
+            + score(grad_total - grad_left, hess_total - hess_left)
+            - score(grad_total, hess_total)
+        )
+        - gamma
+    )
+
+
+def test_newton_gain_matches_numpy_on_large_node() -> None:
+    rng = np.random.default_rng(0)
+    n_rows, n_bins = 5_000_000, 255
+    hessians = rng.uniform(0.05, 0.25, n_rows)
+    gradients = rng.normal(0.0, 0.5, n_rows)
+    bins = rng.integers(0, n_bins, n_rows)
+    hess_left = np.cumsum(np.bincount(bins, weights=hessians, minlength=n_bins))[:-1]
+    grad_left = np.cumsum(np.bincount(bins, weights=gradients, minlength=n_bins))[:-1]
+
+    gains = NewtonGain(reg_lambda=1.0, gamma=0.5)(
+        hess_left, grad_left, hessians.sum(), gradients.sum()
+    )
+
+    expected = _numpy_gain(grad_left, hess_left, gradients.sum(), hessians.sum(), 1.0, 0.5)
+    assert gains.dtype == np.float64
+    np.testing.assert_allclose(gains, expected, rtol=1e-9, atol=1e-9)
+
+
+def test_xgboost_gain_matches_numpy_on_large_node() -> None:
+    rng = np.random.default_rng(1)
+    n_left = np.sort(rng.integers(0, 5_000_000, (3, 100))).astype(np.float64)
+    n_positive_left = np.floor(n_left * 0.3 + rng.normal(0, 100, n_left.shape)).clip(0, n_left)
+    n_total, n_positive_total = 5_000_000.0, 1_500_000.0
+
+    gains = XGBoostGain()(n_left, n_positive_left, n_total, n_positive_total)
+
+    p = n_positive_total / n_total
+    expected = _numpy_gain(
+        n_left * p - n_positive_left,
+        n_left * p * (1 - p),
+        n_total * p - n_positive_total,
+        n_total * p * (1 - p),
+        1.0,
+        0.0,
+    )
+    assert gains.shape == n_left.shape
+    np.testing.assert_allclose(gains, expected, rtol=1e-9, atol=1e-9)